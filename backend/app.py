@@ -2,7 +2,9 @@ from flask import Flask, jsonify, request
 from flask_cors import CORS
 import psycopg2
 from psycopg2.extras import RealDictCursor
+import io
 import os
+import csv
 import logging
 from datetime import datetime
 
@@ -20,6 +22,22 @@ DB_NAME = os.getenv('DB_NAME', 'hackathon_db')
 DB_USER = os.getenv('DB_USER', 'hackathon_user')
 DB_PASSWORD = os.getenv('DB_PASSWORD', 'hackathon_password')
 
+# Timestamps built into JSON by Postgres are formatted the way Flask's jsonify renders
+# datetimes (RFC 1123), so composite endpoints match the rest of the API
+HTTP_DATE_FORMAT = 'Dy, DD Mon YYYY HH24:MI:SS "GMT"'
+
+# Bulk ingestion limits
+BULK_MAX_SOCIALS = int(os.getenv('BULK_MAX_SOCIALS', '5000'))
+BULK_DEFAULT_WINDOW_MINUTES = 120
+BULK_MAX_WINDOW_MINUTES = 7 * 24 * 60
+# Text fields of a bulk record and their column lengths (None: unlimited)
+BULK_TEXT_FIELDS = {'name': 255, 'description': None, 'location': 255,
+                    'created_by_username': 255, 'status': 50}
+BIGINT_MAX = 2 ** 63 - 1
+# POST /api/socials/archive: how old (in days) a finished social must be to be archived
+ARCHIVE_DEFAULT_DAYS = 30
+ARCHIVE_MAX_DAYS = 100 * 365
+
 def get_db_connection():
     """Create a connection to the PostgreSQL database"""
     conn = psycopg2.connect(
@@ -95,13 +113,17 @@ def get_social(social_id):
         if not social:
             return jsonify({'error': 'Social not found'}), 404
 
-        # Get attendance details
+        # Get attendance details (archived socials keep theirs in social_attendance_archive)
         cur.execute('''
             SELECT discord_id, rsvp_status, actual_attended, rsvp_date
             FROM social_attendance
             WHERE social_id = %s
+            UNION ALL
+            SELECT discord_id, rsvp_status, actual_attended, rsvp_date
+            FROM social_attendance_archive
+            WHERE social_id = %s
             ORDER BY rsvp_date DESC
-        ''', (social_id,))
+        ''', (social_id, social_id))
         attendance = cur.fetchall()
 
         cur.close()
@@ -114,6 +136,116 @@ def get_social(social_id):
         logger.error(f'GET /api/socials/{social_id} failed: {str(e)}')
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/socials/<int:social_id>/page', methods=['GET'])
+def get_social_page(social_id):
+    """
+    Everything the scheduling page needs in one response: the social, its attendees,
+    availability counts per slot, and the caller's own submission.
+    Built by a single SQL statement so the page costs one DB round trip.
+    """
+    logger.info(f'GET /api/socials/{social_id}/page requested')
+    try:
+        discord_id = request.args.get('discord_id', type=int)
+        username = request.args.get('username')
+
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute('''
+            WITH social AS (
+                SELECT * FROM socials WHERE id = %(social_id)s
+            ),
+            attendance AS (
+                -- Archived socials keep their attendance in social_attendance_archive, without availability
+                SELECT a.*, du.username, du.display_name
+                FROM (
+                    SELECT discord_id, rsvp_status, actual_attended, availability_submitted,
+                           availability_slots, rsvp_date, updated_at
+                    FROM social_attendance
+                    WHERE social_id = %(social_id)s
+                    UNION ALL
+                    SELECT discord_id, rsvp_status, actual_attended, availability_submitted,
+                           NULL::jsonb, rsvp_date, NULL::timestamp
+                    FROM social_attendance_archive
+                    WHERE social_id = %(social_id)s
+                ) a
+                LEFT JOIN discord_users du ON du.discord_id = a.discord_id
+            ),
+            me AS (
+                SELECT discord_id, username, display_name
+                FROM discord_users
+                WHERE discord_id = %(discord_id)s
+                   OR (%(discord_id)s IS NULL AND username = %(username)s)
+                LIMIT 1
+            ),
+            slots AS (
+                -- availability_slots: [{"date": "2025-01-31", "times": ["10:00", ...]}, ...]
+                SELECT slot->>'date' AS date, t.time, COUNT(DISTINCT a.discord_id) AS available
+                FROM attendance a
+                CROSS JOIN LATERAL jsonb_array_elements(
+                    CASE WHEN jsonb_typeof(a.availability_slots) = 'array' THEN a.availability_slots ELSE '[]' END
+                ) AS slot
+                CROSS JOIN LATERAL jsonb_array_elements_text(
+                    CASE WHEN jsonb_typeof(slot->'times') = 'array' THEN slot->'times' ELSE '[]' END
+                ) AS t(time)
+                WHERE a.availability_submitted
+                GROUP BY 1, 2
+            )
+            SELECT json_build_object(
+                'social', (
+                    SELECT to_jsonb(social) || jsonb_build_object(
+                        'event_date', to_char(event_date, %(http_date)s),
+                        'created_at', to_char(created_at, %(http_date)s),
+                        'status_changed_at', to_char(status_changed_at, %(http_date)s),
+                        'archived_at', to_char(archived_at, %(http_date)s)
+                    )
+                    FROM social
+                ),
+                'attendees', COALESCE((
+                    SELECT json_agg(json_build_object(
+                        'discord_id', discord_id,
+                        'username', username,
+                        'display_name', display_name,
+                        'rsvp_status', rsvp_status,
+                        'actual_attended', actual_attended,
+                        'availability_submitted', availability_submitted,
+                        'rsvp_date', to_char(rsvp_date, %(http_date)s)
+                    ) ORDER BY rsvp_date DESC)
+                    FROM attendance
+                ), '[]'::json),
+                'availability', json_build_object(
+                    'submissions', (SELECT COUNT(*) FROM attendance WHERE availability_submitted),
+                    'slots', COALESCE((
+                        SELECT json_agg(json_build_object('date', date, 'time', time, 'available', available)
+                                        ORDER BY date, time)
+                        FROM slots
+                    ), '[]'::json)
+                ),
+                'user', (SELECT row_to_json(me) FROM me),
+                'my_submission', (
+                    SELECT json_build_object(
+                        'rsvp_status', a.rsvp_status,
+                        'availability_submitted', a.availability_submitted,
+                        'availability_slots', a.availability_slots,
+                        'updated_at', to_char(a.updated_at, %(http_date)s)
+                    )
+                    FROM attendance a JOIN me ON me.discord_id = a.discord_id
+                )
+            )
+        ''', {'social_id': social_id, 'discord_id': discord_id, 'username': username,
+              'http_date': HTTP_DATE_FORMAT})
+        page = cur.fetchone()[0]
+        cur.close()
+        conn.close()
+
+        if page['social'] is None:
+            return jsonify({'error': 'Social not found'}), 404
+
+        logger.info(f"Retrieved page for social {social_id} with {len(page['attendees'])} attendees")
+        return jsonify(page), 200
+    except Exception as e:
+        logger.error(f'GET /api/socials/{social_id}/page failed: {str(e)}')
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/socials', methods=['POST'])
 def create_social():
     """Create a new social event"""
@@ -134,8 +266,8 @@ def create_social():
         ''', (discord_id, username))
 
         cur.execute('''
-            INSERT INTO socials (name, description, location, event_date, created_by, status)
-            VALUES (%s, %s, %s, %s, %s, %s)
+            INSERT INTO socials (name, description, location, event_date, created_by, status, guild_id, channel_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
             RETURNING id, name, description, location, event_date, status, group_points, created_at
         ''', (
             data.get('name'),
@@ -143,7 +275,9 @@ def create_social():
             data.get('location'),
             data.get('event_date'),
             discord_id,
-            data.get('status', 'planned')
+            data.get('status', 'planned'),
+            data.get('guild_id'),
+            data.get('channel_id')
         ))
 
         new_social = cur.fetchone()
@@ -167,6 +301,239 @@ def create_social():
         logger.error(f'POST /api/socials failed: {str(e)}')
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/socials/bulk', methods=['POST'])
+def bulk_create_socials():
+    """
+    Create many socials in one transaction, skipping duplicates.
+
+    Body: {"socials": [{name, description, location, event_date, created_by,
+    created_by_username, status, guild_id, channel_id}, ...], "window_minutes": 120}.
+    Records are duplicates when their social_key(name) and social_key(location) match
+    and their event_dates are within the window (or both missing). Within the batch,
+    records sharing a key are taken in event_date order: each group starts at its
+    earliest record and collapses every record within the window of that one into a
+    single social, so records spread out in steps smaller than the window still split
+    into several socials. A group that duplicates an existing social maps to it.
+    Returns one result per input record, in order:
+    {index, id, status} where status is created, existing, duplicate or invalid.
+    """
+    logger.info('POST /api/socials/bulk requested')
+    try:
+        data = request.get_json(silent=True)
+        socials = data.get('socials') if isinstance(data, dict) else None
+        if not isinstance(socials, list) or not socials:
+            return jsonify({'error': 'socials must be a non-empty list'}), 400
+        if len(socials) > BULK_MAX_SOCIALS:
+            return jsonify({'error': f'At most {BULK_MAX_SOCIALS} socials per request'}), 400
+        try:
+            window_minutes = _bulk_int(data.get('window_minutes', BULK_DEFAULT_WINDOW_MINUTES),
+                                       'window_minutes', BULK_MAX_WINDOW_MINUTES)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Reject bad records up front so one of them can't abort the COPY for the rest
+        results = {}
+        rows = io.StringIO()
+        writer = csv.writer(rows)
+        for index, social in enumerate(socials):
+            try:
+                row = _bulk_social_row(social)
+            except ValueError as e:
+                results[index] = {'index': index, 'id': None, 'status': 'invalid', 'error': str(e)}
+                continue
+            writer.writerow([index] + row)
+
+        if len(results) < len(socials):
+            conn = get_db_connection()
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+
+            cur.execute('''
+                CREATE TEMP TABLE socials_staging (
+                    idx INT PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    description TEXT,
+                    location VARCHAR(255),
+                    event_date TIMESTAMP,
+                    created_by BIGINT,
+                    created_by_username VARCHAR(255),
+                    status VARCHAR(50),
+                    guild_id BIGINT,
+                    channel_id BIGINT,
+                    name_key TEXT,
+                    location_key TEXT,
+                    n INT, -- position among the records sharing its keys, in event_date order
+                    rep INT, -- first record of the group of in-batch duplicates this one belongs to
+                    existing_id INT,
+                    new_id INT
+                ) ON COMMIT DROP
+            ''')
+            rows.seek(0)
+            cur.copy_expert('''
+                COPY socials_staging (idx, name, description, location, event_date, created_by,
+                                      created_by_username, status, guild_id, channel_id)
+                FROM STDIN WITH (FORMAT csv)
+            ''', rows)
+
+            # Creators, once each instead of once per social
+            cur.execute('''
+                INSERT INTO discord_users (discord_id, username)
+                SELECT DISTINCT ON (created_by) created_by, COALESCE(created_by_username, 'User_' || created_by)
+                FROM socials_staging
+                WHERE created_by IS NOT NULL
+                ORDER BY created_by, idx
+                ON CONFLICT (discord_id) DO NOTHING
+            ''')
+
+            # Hold off other writes to socials until this batch is in, so two loads of the
+            # same events can't both decide they're new. Reads are not blocked.
+            cur.execute('LOCK TABLE socials IN SHARE ROW EXCLUSIVE MODE')
+
+            # Group in-batch duplicates: within one key, in date order, a record joins the
+            # current group if it is within the window of the group's first record, and
+            # otherwise starts the next one. That takes a walk down each key, one record
+            # per step. Missing dates form their own group.
+            cur.execute('''
+                UPDATE socials_staging SET name_key = social_key(name), location_key = social_key(location);
+
+                UPDATE socials_staging st
+                SET n = o.n
+                FROM (
+                    SELECT idx, ROW_NUMBER() OVER (PARTITION BY name_key, location_key
+                                                   ORDER BY event_date NULLS LAST, idx) as n
+                    FROM socials_staging
+                ) o
+                WHERE st.idx = o.idx;
+
+                CREATE INDEX ON socials_staging (name_key, location_key, n);
+                ANALYZE socials_staging;
+
+                WITH RECURSIVE grouped AS (
+                    SELECT idx, name_key, location_key, n, idx as rep, event_date as rep_date
+                    FROM socials_staging
+                    WHERE n = 1
+                    UNION ALL
+                    SELECT st.idx, st.name_key, st.location_key, st.n,
+                           CASE WHEN same THEN g.rep ELSE st.idx END,
+                           CASE WHEN same THEN g.rep_date ELSE st.event_date END
+                    FROM grouped g
+                    JOIN socials_staging st
+                      ON st.name_key = g.name_key AND st.location_key = g.location_key AND st.n = g.n + 1
+                    CROSS JOIN LATERAL (
+                        SELECT COALESCE(st.event_date - g.rep_date <= %(window)s * INTERVAL '1 minute',
+                                        st.event_date IS NULL AND g.rep_date IS NULL) as same
+                    ) joins
+                )
+                UPDATE socials_staging st
+                SET rep = g.rep
+                FROM grouped g
+                WHERE st.idx = g.idx;
+            ''', {'window': window_minutes})
+
+            # Match each group to the closest existing social any of its records duplicates
+            cur.execute('''
+                UPDATE socials_staging st
+                SET existing_id = m.id
+                FROM (
+                    SELECT DISTINCT ON (st.rep) st.rep, s.id
+                    FROM socials_staging st
+                    JOIN socials s
+                      ON social_key(s.name) = st.name_key
+                     AND social_key(s.location) = st.location_key
+                     AND (s.event_date BETWEEN st.event_date - %(window)s * INTERVAL '1 minute'
+                                           AND st.event_date + %(window)s * INTERVAL '1 minute'
+                          OR (s.event_date IS NULL AND st.event_date IS NULL))
+                    ORDER BY st.rep, ABS(EXTRACT(EPOCH FROM s.event_date - st.event_date)) NULLS FIRST, s.id
+                ) m
+                WHERE st.rep = m.rep
+            ''', {'window': window_minutes})
+
+            # Take ids up front so each inserted social maps back to its input record
+            cur.execute('''
+                UPDATE socials_staging
+                SET new_id = nextval(pg_get_serial_sequence('socials', 'id'))
+                WHERE idx = rep AND existing_id IS NULL
+            ''')
+            # The attendance partition trigger runs per inserted row, but only does work
+            # for the first social of each partition range
+            cur.execute('''
+                INSERT INTO socials (id, name, description, location, event_date, created_by, status, guild_id, channel_id)
+                SELECT new_id, name, description, location, event_date, created_by,
+                       COALESCE(status, 'planned'), guild_id, channel_id
+                FROM socials_staging
+                WHERE new_id IS NOT NULL
+                ORDER BY new_id
+            ''')
+
+            cur.execute('''
+                SELECT st.idx as index,
+                       COALESCE(st.existing_id, rep.new_id) as id,
+                       CASE WHEN st.existing_id IS NOT NULL THEN 'existing'
+                            WHEN st.new_id IS NOT NULL THEN 'created'
+                            ELSE 'duplicate' END as status
+                FROM socials_staging st
+                JOIN socials_staging rep ON rep.idx = st.rep
+            ''')
+            for row in cur.fetchall():
+                results[row['index']] = dict(row)
+
+            conn.commit()
+            cur.close()
+            conn.close()
+
+        results = [results[index] for index in range(len(socials))]
+        counts = {status: sum(1 for r in results if r['status'] == status)
+                  for status in ('created', 'existing', 'duplicate', 'invalid')}
+        logger.info(f'Bulk loaded {len(socials)} socials: {counts}')
+        return jsonify({'results': results, **counts}), 200
+    except Exception as e:
+        logger.error(f'POST /api/socials/bulk failed: {str(e)}')
+        return jsonify({'error': str(e)}), 500
+
+def _bulk_int(value, field, maximum=BIGINT_MAX):
+    """A non-negative integer given as a JSON number or a string of ASCII digits, up to maximum"""
+    if isinstance(value, str) and value.isascii() and value.isdigit():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= maximum:
+        raise ValueError(f'{field} must be an integer from 0 to {maximum}')
+    return value
+
+def _bulk_social_row(social):
+    """
+    A bulk record's values in socials_staging column order, normalized so the COPY
+    accepts every one. Raises ValueError saying why a record can't be loaded.
+    """
+    if not isinstance(social, dict):
+        raise ValueError('Record must be an object')
+
+    text = {}
+    for field, max_length in BULK_TEXT_FIELDS.items():
+        value = social.get(field)
+        if value is not None:
+            if not isinstance(value, str):
+                raise ValueError(f'{field} must be a string')
+            if max_length is not None and len(value) > max_length:
+                raise ValueError(f'{field} must be at most {max_length} characters')
+            # Postgres text can't hold NUL, and lone surrogates (valid in JSON) have no UTF-8 form
+            if any(c == '\x00' or '\ud800' <= c <= '\udfff' for c in value):
+                raise ValueError(f'{field} contains characters that can\'t be stored')
+        text[field] = value
+    if not (text['name'] or '').strip():
+        raise ValueError('name is required')
+
+    event_date = social.get('event_date')
+    if event_date is not None:
+        try:
+            # Like a TIMESTAMP column, keep the wall-clock time and drop any UTC offset
+            event_date = datetime.fromisoformat(event_date).replace(tzinfo=None).isoformat()
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid event_date: {event_date}')
+
+    ids = {field: None if social.get(field) is None else _bulk_int(social.get(field), field)
+           for field in ('created_by', 'guild_id', 'channel_id')}
+
+    return [text['name'], text['description'], text['location'], event_date, ids['created_by'],
+            text['created_by_username'], text['status'], ids['guild_id'], ids['channel_id']]
+
 @app.route('/api/socials/<int:social_id>', methods=['PUT'])
 def update_social(social_id):
     """Update a social event status or details"""
@@ -214,6 +581,38 @@ def update_social(social_id):
         logger.error(f'PUT /api/socials/{social_id} failed: {str(e)}')
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/socials/archive', methods=['POST'])
+def archive_socials():
+    """
+    Move attendance of socials completed or cancelled more than `older_than_days` ago
+    into the slim archive table, and drop attendance partitions left empty.
+    """
+    logger.info('POST /api/socials/archive requested')
+    try:
+        # An empty body archives with the default age; anything else must be an object
+        data = request.get_json(silent=True) if request.get_data() else {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        try:
+            older_than_days = _bulk_int(data.get('older_than_days', ARCHIVE_DEFAULT_DAYS),
+                                        'older_than_days', ARCHIVE_MAX_DAYS)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute("SELECT archive_socials(%s * INTERVAL '1 day')", (older_than_days,))
+        archived = cur.fetchone()[0]
+        conn.commit()
+        cur.close()
+        conn.close()
+
+        logger.info(f'Archived {archived} socials older than {older_than_days} days')
+        return jsonify({'archived': archived, 'older_than_days': older_than_days}), 200
+    except Exception as e:
+        logger.error(f'POST /api/socials/archive failed: {str(e)}')
+        return jsonify({'error': str(e)}), 500
+
 # =====================
 # ATTENDANCE ENDPOINTS
 # =====================
@@ -278,11 +677,14 @@ def update_attendance(social_id, discord_id):
         if not updates:
             return jsonify({'error': 'No valid fields to update'}), 400
 
-        updates.append('updated_at = NOW()')
         params.extend([social_id, discord_id])
 
-        query = f"UPDATE social_attendance SET {', '.join(updates)} WHERE social_id = %s AND discord_id = %s"
+        query = f"UPDATE social_attendance SET {', '.join(updates + ['updated_at = NOW()'])} WHERE social_id = %s AND discord_id = %s"
         cur.execute(query, params)
+        if cur.rowcount == 0:
+            # The social may have been archived; corrections still count towards the leaderboard
+            query = f"UPDATE social_attendance_archive SET {', '.join(updates)} WHERE social_id = %s AND discord_id = %s"
+            cur.execute(query, params)
         conn.commit()
         cur.close()
         conn.close()
@@ -317,8 +719,11 @@ def get_group_stats():
         cur.execute('SELECT COUNT(*) as count FROM socials WHERE status = %s', ('planned',))
         upcoming_socials = cur.fetchone()['count']
 
-        # Total attendees across all events
-        cur.execute('SELECT COUNT(*) as count FROM social_attendance')
+        # Total attendees across all events, including archived ones
+        cur.execute('''
+            SELECT (SELECT COUNT(*) FROM social_attendance)
+                 + (SELECT COUNT(*) FROM social_attendance_archive) as count
+        ''')
         total_attendances = cur.fetchone()['count']
 
         cur.close()
@@ -349,13 +754,18 @@ def get_user_stats(discord_id):
         if not user:
             return jsonify({'error': 'User not found'}), 404
 
-        # RSVPs
-        cur.execute('SELECT COUNT(*) as count FROM social_attendance WHERE discord_id = %s', (discord_id,))
-        total_rsvps = cur.fetchone()['count']
-
-        # Actual attendances
-        cur.execute('SELECT COUNT(*) as count FROM social_attendance WHERE discord_id = %s AND actual_attended = TRUE', (discord_id,))
-        attended = cur.fetchone()['count']
+        # RSVPs and actual attendances, hot and archived
+        cur.execute('''
+            SELECT COUNT(*) as total_rsvps, COUNT(*) FILTER (WHERE actual_attended) as attended
+            FROM (
+                SELECT actual_attended FROM social_attendance WHERE discord_id = %s
+                UNION ALL
+                SELECT actual_attended FROM social_attendance_archive WHERE discord_id = %s
+            ) attendance
+        ''', (discord_id, discord_id))
+        counts = cur.fetchone()
+        total_rsvps = counts['total_rsvps']
+        attended = counts['attended']
 
         # Upcoming socials user is attending
         cur.execute('''
@@ -381,6 +791,53 @@ def get_user_stats(discord_id):
         logger.error(f'GET /api/stats/user/{discord_id} failed: {str(e)}')
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/leaderboard', methods=['GET'])
+def get_leaderboard():
+    """Get the top users by points then attendance, and optionally one user's rank"""
+    logger.info('GET /api/leaderboard requested')
+    try:
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+        discord_id = request.args.get('discord_id', type=int)
+
+        conn = get_db_connection()
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+
+        # user_leaderboard is maintained by triggers, so this is a short walk down idx_leaderboard_rank.
+        # Ties share a rank; everyone above a top-N row is in the top N, so RANK() is exact here.
+        cur.execute('''
+            SELECT RANK() OVER (ORDER BY lb.points DESC, lb.attended DESC) as rank,
+                   lb.discord_id, u.username, u.display_name, lb.points, lb.attended, lb.rsvps
+            FROM (
+                SELECT * FROM user_leaderboard
+                ORDER BY points DESC, attended DESC, discord_id DESC
+                LIMIT %s
+            ) lb
+            JOIN discord_users u ON u.discord_id = lb.discord_id
+            ORDER BY lb.points DESC, lb.attended DESC, lb.discord_id DESC
+        ''', (limit,))
+        top = cur.fetchall()
+
+        user = None
+        if discord_id is not None:
+            # Rank = 1 + users strictly ahead, summed per distinct score from leaderboard_scores
+            cur.execute('''
+                SELECT lb.discord_id, u.username, u.display_name, lb.points, lb.attended, lb.rsvps,
+                       1 + (SELECT COALESCE(SUM(ahead.users), 0) FROM leaderboard_scores ahead
+                            WHERE (ahead.points, ahead.attended) > (lb.points, lb.attended)) as rank
+                FROM user_leaderboard lb
+                JOIN discord_users u ON u.discord_id = lb.discord_id
+                WHERE lb.discord_id = %s
+            ''', (discord_id,))
+            user = cur.fetchone()
+
+        cur.close()
+        conn.close()
+
+        return jsonify({'leaderboard': top, 'user': user}), 200
+    except Exception as e:
+        logger.error(f'GET /api/leaderboard failed: {str(e)}')
+        return jsonify({'error': str(e)}), 500
+
 # =====================
 # AVAILABILITY/SCHEDULING ENDPOINTS
 # =====================
@@ -18,14 +18,43 @@ CREATE TABLE IF NOT EXISTS socials (
   created_by BIGINT REFERENCES discord_users(discord_id),
   status VARCHAR(50) DEFAULT 'planned', -- planned, ongoing, completed, cancelled
   group_points INT DEFAULT 0,
+  guild_id BIGINT, -- Discord guild/channel the event was scheduled from (used by the bot's dedup index)
+  channel_id BIGINT,
+  status_changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, -- when status last changed (drives archival)
+  archived_at TIMESTAMP, -- set once attendance has been moved to social_attendance_archive
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Columns added since the first release, for databases created from an earlier init.sql.
+-- Existing socials start their archival clock from the upgrade.
+ALTER TABLE socials
+  ADD COLUMN IF NOT EXISTS guild_id BIGINT,
+  ADD COLUMN IF NOT EXISTS channel_id BIGINT,
+  ADD COLUMN IF NOT EXISTS status_changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP;
+
+-- An existing unpartitioned social_attendance (with a serial id) is moved aside here and its
+-- rows copied into the partitioned table once the partitioning functions exist, further down
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass('social_attendance') AND relkind = 'r') THEN
+    ALTER TABLE social_attendance RENAME TO social_attendance_unpartitioned;
+    ALTER TABLE social_attendance_unpartitioned
+      RENAME CONSTRAINT social_attendance_pkey TO social_attendance_unpartitioned_pkey;
+    ALTER TABLE social_attendance_unpartitioned
+      DROP CONSTRAINT IF EXISTS social_attendance_social_id_fkey,
+      DROP CONSTRAINT IF EXISTS social_attendance_discord_id_fkey;
+    DROP INDEX IF EXISTS idx_attendance_social, idx_attendance_user;
+  END IF;
+END;
+$$;
+
 -- Social Attendance table (tracking who said they will come and actual attendance)
+-- Partitioned by ranges of social_id: ids are assigned in creation order, so each partition
+-- covers one period of events. Partitions are created automatically as socials are inserted.
 CREATE TABLE IF NOT EXISTS social_attendance (
-  id SERIAL PRIMARY KEY,
-  social_id INT REFERENCES socials(id) ON DELETE CASCADE,
-  discord_id BIGINT REFERENCES discord_users(discord_id),
+  social_id INT NOT NULL REFERENCES socials(id) ON DELETE CASCADE,
+  discord_id BIGINT NOT NULL REFERENCES discord_users(discord_id),
   rsvp_status VARCHAR(50) DEFAULT 'attending', -- attending, maybe, not_attending
   actual_attended BOOLEAN DEFAULT FALSE,
   availability_submitted BOOLEAN DEFAULT FALSE,
@@ -33,14 +62,325 @@ CREATE TABLE IF NOT EXISTS social_attendance (
   availability_slots JSONB,
   rsvp_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-  UNIQUE(social_id, discord_id)
+  PRIMARY KEY (social_id, discord_id)
+) PARTITION BY RANGE (social_id);
+
+-- Safety net for rows outside every partition; ensure_attendance_partition() moves them out
+CREATE TABLE IF NOT EXISTS social_attendance_default PARTITION OF social_attendance DEFAULT;
+
+-- Slim copy of attendance for socials that finished long ago: no availability blobs
+CREATE TABLE IF NOT EXISTS social_attendance_archive (
+  social_id INT NOT NULL REFERENCES socials(id) ON DELETE CASCADE,
+  discord_id BIGINT NOT NULL REFERENCES discord_users(discord_id),
+  rsvp_status VARCHAR(50),
+  actual_attended BOOLEAN DEFAULT FALSE,
+  availability_submitted BOOLEAN DEFAULT FALSE,
+  rsvp_date TIMESTAMP,
+  archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (social_id, discord_id)
+);
+
+-- Number of socials per social_attendance partition
+CREATE OR REPLACE FUNCTION attendance_partition_size() RETURNS INT AS $$
+  SELECT 1000
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Create the partition holding a social's attendance, if it doesn't exist yet
+CREATE OR REPLACE FUNCTION ensure_attendance_partition(p_social_id INT) RETURNS VOID AS $$
+DECLARE
+  range_start INT := (p_social_id / attendance_partition_size()) * attendance_partition_size();
+  range_end INT := range_start + attendance_partition_size();
+  partition_name TEXT := format('social_attendance_p%s', range_start);
+BEGIN
+  IF to_regclass(partition_name) IS NOT NULL THEN
+    RETURN;
+  END IF;
+
+  -- Serialize concurrent creators of the same partition
+  PERFORM pg_advisory_xact_lock(hashtext('social_attendance_partition'), range_start);
+  IF to_regclass(partition_name) IS NOT NULL THEN
+    RETURN;
+  END IF;
+
+  IF EXISTS (SELECT 1 FROM social_attendance_default WHERE social_id >= range_start AND social_id < range_end) THEN
+    -- Rows for this range landed in the default partition: move them into the new one before attaching
+    EXECUTE format('CREATE TABLE %I (LIKE social_attendance INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name);
+    EXECUTE format(
+      'WITH moved AS (DELETE FROM social_attendance_default WHERE social_id >= %s AND social_id < %s RETURNING *)
+       INSERT INTO %I SELECT * FROM moved',
+      range_start, range_end, partition_name
+    );
+    EXECUTE format('ALTER TABLE social_attendance ATTACH PARTITION %I FOR VALUES FROM (%s) TO (%s)',
+                   partition_name, range_start, range_end);
+  ELSE
+    EXECUTE format('CREATE TABLE %I PARTITION OF social_attendance FOR VALUES FROM (%s) TO (%s)',
+                   partition_name, range_start, range_end);
+  END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION socials_create_attendance_partition() RETURNS TRIGGER AS $$
+BEGIN
+  PERFORM ensure_attendance_partition(NEW.id);
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS socials_attendance_partition ON socials;
+CREATE TRIGGER socials_attendance_partition
+  AFTER INSERT ON socials
+  FOR EACH ROW EXECUTE FUNCTION socials_create_attendance_partition();
+
+-- Finish the upgrade started above: partitions for every existing social, then the rows.
+-- Rows without a social or user can't be keyed and are dropped.
+DO $$
+BEGIN
+  IF to_regclass('social_attendance_unpartitioned') IS NOT NULL THEN
+    PERFORM ensure_attendance_partition(id) FROM socials;
+    INSERT INTO social_attendance (social_id, discord_id, rsvp_status, actual_attended, availability_submitted,
+                                   availability_slots, rsvp_date, updated_at)
+    SELECT social_id, discord_id, rsvp_status, actual_attended, availability_submitted,
+           availability_slots, rsvp_date, updated_at
+    FROM social_attendance_unpartitioned
+    WHERE social_id IS NOT NULL AND discord_id IS NOT NULL;
+    DROP TABLE social_attendance_unpartitioned;
+  END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION socials_track_status_change() RETURNS TRIGGER AS $$
+BEGIN
+  IF NEW.status IS DISTINCT FROM OLD.status THEN
+    NEW.status_changed_at := CURRENT_TIMESTAMP;
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS socials_status_changed ON socials;
+CREATE TRIGGER socials_status_changed
+  BEFORE UPDATE OF status ON socials
+  FOR EACH ROW EXECUTE FUNCTION socials_track_status_change();
+
+-- Move attendance of socials completed or cancelled more than `older_than` ago into
+-- social_attendance_archive, then drop partitions left holding nothing but archived socials.
+-- Returns the number of socials archived.
+CREATE OR REPLACE FUNCTION archive_socials(older_than INTERVAL) RETURNS INT AS $$
+DECLARE
+  archived INT;
+  max_id INT;
+  range_start INT;
+  partition_name TEXT;
+  partition_empty BOOLEAN;
+BEGIN
+  -- Rows are only moving between tables, so the leaderboard triggers leave them alone
+  PERFORM set_config('app.archiving', 'on', true);
+
+  WITH archiving AS (
+    SELECT id FROM socials
+    WHERE status IN ('completed', 'cancelled')
+      AND archived_at IS NULL
+      AND status_changed_at < CURRENT_TIMESTAMP - older_than
+    FOR UPDATE
+  ),
+  moved AS (
+    DELETE FROM social_attendance sa
+    USING archiving a
+    WHERE sa.social_id = a.id
+    RETURNING sa.social_id, sa.discord_id, sa.rsvp_status, sa.actual_attended, sa.availability_submitted, sa.rsvp_date
+  ),
+  -- No ON CONFLICT: an archive row for the same attendance is already on the leaderboard, and
+  -- quietly keeping either copy would leave the totals counting both, so that fails the archival
+  copied AS (
+    INSERT INTO social_attendance_archive (social_id, discord_id, rsvp_status, actual_attended, availability_submitted, rsvp_date)
+    SELECT * FROM moved
+  )
+  UPDATE socials s SET archived_at = CURRENT_TIMESTAMP
+  FROM archiving a
+  WHERE s.id = a.id;
+  GET DIAGNOSTICS archived = ROW_COUNT;
+
+  -- A partition can go once its whole id range has been allocated, every social in it
+  -- is archived and nothing has been written to it since
+  SELECT MAX(id) INTO max_id FROM socials;
+  range_start := 0;
+  WHILE range_start + attendance_partition_size() <= COALESCE(max_id, 0) LOOP
+    partition_name := format('social_attendance_p%s', range_start);
+    IF to_regclass(partition_name) IS NOT NULL AND NOT EXISTS (
+      SELECT 1 FROM socials
+      WHERE id >= range_start AND id < range_start + attendance_partition_size() AND archived_at IS NULL
+    ) THEN
+      EXECUTE format('SELECT NOT EXISTS (SELECT 1 FROM %I)', partition_name) INTO partition_empty;
+      IF partition_empty THEN
+        EXECUTE format('DROP TABLE %I', partition_name);
+      END IF;
+    END IF;
+    range_start := range_start + attendance_partition_size();
+  END LOOP;
+
+  PERFORM set_config('app.archiving', 'off', true);
+  RETURN archived;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Per-user totals behind /api/leaderboard, kept current by the triggers below rather
+-- than counted per request. Covers hot and archived attendance.
+CREATE TABLE IF NOT EXISTS user_leaderboard (
+  discord_id BIGINT PRIMARY KEY REFERENCES discord_users(discord_id) ON DELETE CASCADE,
+  rsvps INT NOT NULL DEFAULT 0, -- attendance rows with rsvp_status 'attending' or 'maybe'
+  attended INT NOT NULL DEFAULT 0,
+  points BIGINT NOT NULL DEFAULT 0, -- group_points of every social the user actually attended
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE OR REPLACE FUNCTION leaderboard_adjust(p_discord_id BIGINT, p_rsvps INT, p_attended INT, p_points BIGINT)
+RETURNS VOID AS $$
+  INSERT INTO user_leaderboard (discord_id, rsvps, attended, points)
+  VALUES (p_discord_id, p_rsvps, p_attended, p_points)
+  ON CONFLICT (discord_id) DO UPDATE SET
+    rsvps = user_leaderboard.rsvps + EXCLUDED.rsvps,
+    attended = user_leaderboard.attended + EXCLUDED.attended,
+    points = user_leaderboard.points + EXCLUDED.points,
+    updated_at = CURRENT_TIMESTAMP
+$$ LANGUAGE sql;
+
+-- Shared by social_attendance and social_attendance_archive, which have the same key columns
+CREATE OR REPLACE FUNCTION leaderboard_attendance_changed() RETURNS TRIGGER AS $$
+DECLARE
+  social_points INT;
+BEGIN
+  IF current_setting('app.archiving', true) = 'on' THEN
+    RETURN NULL;
+  END IF;
+
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    SELECT COALESCE(group_points, 0) INTO social_points FROM socials WHERE id = OLD.social_id;
+    PERFORM leaderboard_adjust(
+      OLD.discord_id,
+      CASE WHEN OLD.rsvp_status IN ('attending', 'maybe') THEN -1 ELSE 0 END,
+      CASE WHEN OLD.actual_attended THEN -1 ELSE 0 END,
+      CASE WHEN OLD.actual_attended THEN -COALESCE(social_points, 0) ELSE 0 END
+    );
+  END IF;
+
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    SELECT COALESCE(group_points, 0) INTO social_points FROM socials WHERE id = NEW.social_id;
+    PERFORM leaderboard_adjust(
+      NEW.discord_id,
+      CASE WHEN NEW.rsvp_status IN ('attending', 'maybe') THEN 1 ELSE 0 END,
+      CASE WHEN NEW.actual_attended THEN 1 ELSE 0 END,
+      CASE WHEN NEW.actual_attended THEN COALESCE(social_points, 0) ELSE 0 END
+    );
+  END IF;
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS attendance_leaderboard ON social_attendance;
+CREATE TRIGGER attendance_leaderboard
+  AFTER INSERT OR DELETE OR UPDATE OF discord_id, social_id, rsvp_status, actual_attended ON social_attendance
+  FOR EACH ROW EXECUTE FUNCTION leaderboard_attendance_changed();
+
+DROP TRIGGER IF EXISTS attendance_archive_leaderboard ON social_attendance_archive;
+CREATE TRIGGER attendance_archive_leaderboard
+  AFTER INSERT OR DELETE OR UPDATE OF discord_id, social_id, rsvp_status, actual_attended ON social_attendance_archive
+  FOR EACH ROW EXECUTE FUNCTION leaderboard_attendance_changed();
+
+-- Re-score everyone who attended when a social's points change
+CREATE OR REPLACE FUNCTION leaderboard_points_changed() RETURNS TRIGGER AS $$
+BEGIN
+  UPDATE user_leaderboard lb
+  SET points = lb.points + (COALESCE(NEW.group_points, 0) - COALESCE(OLD.group_points, 0)),
+      updated_at = CURRENT_TIMESTAMP
+  FROM (
+    SELECT discord_id FROM social_attendance WHERE social_id = NEW.id AND actual_attended
+    UNION ALL
+    SELECT discord_id FROM social_attendance_archive WHERE social_id = NEW.id AND actual_attended
+  ) attendees
+  WHERE lb.discord_id = attendees.discord_id;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS socials_points_leaderboard ON socials;
+CREATE TRIGGER socials_points_leaderboard
+  AFTER UPDATE OF group_points ON socials
+  FOR EACH ROW WHEN (NEW.group_points IS DISTINCT FROM OLD.group_points)
+  EXECUTE FUNCTION leaderboard_points_changed();
+
+-- Remove a social's attendance while the social still exists, so the leaderboard
+-- triggers can still read its points (ON DELETE CASCADE would run after it's gone)
+CREATE OR REPLACE FUNCTION socials_delete_attendance() RETURNS TRIGGER AS $$
+BEGIN
+  DELETE FROM social_attendance WHERE social_id = OLD.id;
+  DELETE FROM social_attendance_archive WHERE social_id = OLD.id;
+  RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS socials_delete_leaderboard ON socials;
+CREATE TRIGGER socials_delete_leaderboard
+  BEFORE DELETE ON socials
+  FOR EACH ROW EXECUTE FUNCTION socials_delete_attendance();
+
+-- How many users share each (points, attended) score, so a user's rank is one plus the
+-- users on the scores above theirs: a walk over distinct scores rather than every user ahead.
+-- A per-user rank column would instead rewrite every row a score change passes.
+CREATE TABLE IF NOT EXISTS leaderboard_scores (
+  points BIGINT NOT NULL,
+  attended INT NOT NULL,
+  users INT NOT NULL,
+  PRIMARY KEY (points, attended)
+);
+
+CREATE OR REPLACE FUNCTION leaderboard_score_changed() RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    UPDATE leaderboard_scores SET users = users - 1
+    WHERE points = OLD.points AND attended = OLD.attended;
+    DELETE FROM leaderboard_scores
+    WHERE points = OLD.points AND attended = OLD.attended AND users <= 0;
+  END IF;
+
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    INSERT INTO leaderboard_scores (points, attended, users)
+    VALUES (NEW.points, NEW.attended, 1)
+    ON CONFLICT (points, attended) DO UPDATE SET users = leaderboard_scores.users + 1;
+  END IF;
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS leaderboard_scores_insert_delete ON user_leaderboard;
+CREATE TRIGGER leaderboard_scores_insert_delete
+  AFTER INSERT OR DELETE ON user_leaderboard
+  FOR EACH ROW EXECUTE FUNCTION leaderboard_score_changed();
+
+DROP TRIGGER IF EXISTS leaderboard_scores_update ON user_leaderboard;
+CREATE TRIGGER leaderboard_scores_update
+  AFTER UPDATE OF points, attended ON user_leaderboard
+  FOR EACH ROW WHEN ((NEW.points, NEW.attended) IS DISTINCT FROM (OLD.points, OLD.attended))
+  EXECUTE FUNCTION leaderboard_score_changed();
+
+-- Normalized form of a social's name or location used to spot duplicates:
+-- case-insensitive, surrounding whitespace trimmed, inner runs of whitespace collapsed
+CREATE OR REPLACE FUNCTION social_key(value TEXT) RETURNS TEXT AS $$
+  SELECT lower(regexp_replace(btrim(COALESCE(value, '')), '\s+', ' ', 'g'))
+$$ LANGUAGE sql IMMUTABLE;
+
 -- Create indexes for common queries
 CREATE INDEX IF NOT EXISTS idx_socials_status ON socials(status);
 CREATE INDEX IF NOT EXISTS idx_socials_event_date ON socials(event_date);
-CREATE INDEX IF NOT EXISTS idx_attendance_social ON social_attendance(social_id);
+CREATE INDEX IF NOT EXISTS idx_socials_channel ON socials(guild_id, channel_id);
+-- Duplicate lookups for bulk ingestion: exact key match, then an event_date range
+CREATE INDEX IF NOT EXISTS idx_socials_dedup ON socials(social_key(name), social_key(location), event_date);
+CREATE INDEX IF NOT EXISTS idx_socials_archivable ON socials(status, status_changed_at) WHERE archived_at IS NULL;
 CREATE INDEX IF NOT EXISTS idx_attendance_user ON social_attendance(discord_id);
+CREATE INDEX IF NOT EXISTS idx_attendance_archive_user ON social_attendance_archive(discord_id);
+-- Leaderboard order (points, then attendance); scanned backwards for the top N
+CREATE INDEX IF NOT EXISTS idx_leaderboard_rank ON user_leaderboard(points, attended, discord_id);
 
 -- Seed data: Users
 INSERT INTO discord_users (discord_id, username, display_name)
@@ -51,10 +391,35 @@ VALUES
   (444444444, 'izzy', 'Izzy')
 ON CONFLICT (discord_id) DO NOTHING;
 
--- Seed data: Socials/Events
+-- Seed data: Socials/Events (only into an empty database, so re-running this script doesn't duplicate them)
 INSERT INTO socials (name, description, location, event_date, created_by, status, group_points)
-VALUES
-  ('Coffee Meetup', 'Casual coffee hangout to catch up and chat', 'Downtown Cafe', '2025-02-07 10:00:00', 111111111, 'planned', 0),
-  ('Brunch Party', 'Sunday brunch with the crew at the new brunch spot', 'Riverside Brunch Spot', '2025-02-09 11:00:00', 222222222, 'planned', 0),
-  ('Game Night', 'Board games and video games night', 'Aldiyar''s Place', '2025-02-15 19:00:00', 333333333, 'planned', 0)
-ON CONFLICT DO NOTHING;
+SELECT * FROM (VALUES
+  ('Coffee Meetup', 'Casual coffee hangout to catch up and chat', 'Downtown Cafe', TIMESTAMP '2025-02-07 10:00:00', 111111111, 'planned', 0),
+  ('Brunch Party', 'Sunday brunch with the crew at the new brunch spot', 'Riverside Brunch Spot', TIMESTAMP '2025-02-09 11:00:00', 222222222, 'planned', 0),
+  ('Game Night', 'Board games and video games night', 'Aldiyar''s Place', TIMESTAMP '2025-02-15 19:00:00', 333333333, 'planned', 0)
+) AS seed
+WHERE NOT EXISTS (SELECT 1 FROM socials);
+
+-- Backfill the leaderboard from any attendance recorded before the triggers existed
+INSERT INTO user_leaderboard (discord_id, rsvps, attended, points)
+SELECT a.discord_id,
+       COUNT(*) FILTER (WHERE a.rsvp_status IN ('attending', 'maybe')),
+       COUNT(*) FILTER (WHERE a.actual_attended),
+       COALESCE(SUM(s.group_points) FILTER (WHERE a.actual_attended), 0)
+FROM (
+  SELECT social_id, discord_id, rsvp_status, actual_attended FROM social_attendance
+  UNION ALL
+  SELECT social_id, discord_id, rsvp_status, actual_attended FROM social_attendance_archive
+) a
+JOIN socials s ON s.id = a.social_id
+GROUP BY a.discord_id
+ON CONFLICT (discord_id) DO UPDATE SET
+  rsvps = EXCLUDED.rsvps,
+  attended = EXCLUDED.attended,
+  points = EXCLUDED.points,
+  updated_at = CURRENT_TIMESTAMP;
+
+-- Recount scores from scratch, covering leaderboards filled before leaderboard_scores existed
+TRUNCATE leaderboard_scores;
+INSERT INTO leaderboard_scores (points, attended, users)
+SELECT points, attended, COUNT(*) FROM user_leaderboard GROUP BY points, attended;
@@ -0,0 +1,120 @@
+"""
+Face detection throughput benchmark.
+
+Compares the original one-shot path (save to a temp file, build a FaceDetector,
+load the file, detect) with imageDetection.detect_batch(), for a local corpus of
+images re-encoded at several resolutions.
+
+Usage:
+    python bench_faces.py path/to/images --resolutions 320,640,1280,2560 --repeat 3
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+
+import cv2
+import mediapipe as mp
+from mediapipe.tasks import python
+from mediapipe.tasks.python import vision
+
+from image_detection import imageDetection, MODEL_PATH
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+def load_corpus(directory: Path, resolution: int) -> list[bytes]:
+    """Read every image in the directory, scale its longest side to `resolution` and JPEG-encode it."""
+    images = []
+    for path in sorted(directory.iterdir()):
+        if path.suffix.lower() not in IMAGE_SUFFIXES:
+            continue
+        bgr = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        if bgr is None:
+            continue
+        height, width = bgr.shape[:2]
+        scale = resolution / max(height, width)
+        resized = cv2.resize(bgr, (max(1, round(width * scale)), max(1, round(height * scale))),
+                             interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+        ok, encoded = cv2.imencode(".jpg", resized, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        if ok:
+            images.append(encoded.tobytes())
+    return images
+
+
+def one_shot_count(image_bytes: bytes) -> int:
+    """The bot's original behaviour: temp file + a fresh detector for every image."""
+    fd, temp_path = tempfile.mkstemp(suffix=".jpg")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(image_bytes)
+        options = vision.FaceDetectorOptions(base_options=python.BaseOptions(model_asset_path=str(MODEL_PATH)))
+        with vision.FaceDetector.create_from_options(options) as detector:
+            return len(detector.detect(mp.Image.create_from_file(temp_path)).detections)
+    finally:
+        os.remove(temp_path)
+
+
+def bench_one_shot(images: list[bytes]) -> tuple[float, list[float]]:
+    latencies = []
+    start = time.perf_counter()
+    for image in images:
+        t = time.perf_counter()
+        one_shot_count(image)
+        latencies.append(time.perf_counter() - t)
+    return time.perf_counter() - start, latencies
+
+
+def bench_batch(detector: imageDetection, images: list[bytes]) -> tuple[float, list[float]]:
+    # The same work as detect_batch() (one detector, shared buffers), with each image timed on its own
+    latencies = []
+    start = time.perf_counter()
+    for image in images:
+        t = time.perf_counter()
+        detector.detect(image)
+        latencies.append(time.perf_counter() - t)
+    return time.perf_counter() - start, latencies
+
+
+def report(label: str, resolution: int, elapsed: float, latencies: list[float]) -> None:
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{label:<9} {resolution:>6}px  {len(latencies) / elapsed:>9.1f} img/s  "
+          f"p50 {statistics.median(latencies) * 1000:>8.2f} ms  p95 {p95 * 1000:>8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", type=Path, help="directory of images")
+    parser.add_argument("--resolutions", default="320,640,1280,2560",
+                        help="comma-separated longest-side sizes to re-encode the corpus at")
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the corpus per mode")
+    parser.add_argument("--max-side", type=int, default=640, help="pre-resize limit for the batch path (0 disables)")
+    args = parser.parse_args()
+
+    detector = imageDetection(max_side=args.max_side)
+    _ = detector.detector  # load the model up front so it isn't counted in the first timing
+
+    for resolution in (int(r) for r in args.resolutions.split(",")):
+        images = load_corpus(args.corpus, resolution)
+        if not images:
+            print(f"No readable images in {args.corpus}", file=sys.stderr)
+            return 1
+
+        for label, run in (("one-shot", bench_one_shot), ("batch", lambda batch: bench_batch(detector, batch))):
+            elapsed, latencies = 0.0, []
+            for _ in range(args.repeat):
+                pass_elapsed, pass_latencies = run(images)
+                elapsed += pass_elapsed
+                latencies += pass_latencies
+            report(label, resolution, elapsed, latencies)
+
+    detector.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
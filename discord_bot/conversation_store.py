@@ -0,0 +1,95 @@
+import time
+import threading
+from collections import OrderedDict, deque
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token plus per-turn overhead)."""
+    return len(text) // 4 + 4
+
+
+class ChannelContext:
+    """Ring buffer of recent user/assistant exchanges for one channel, bounded by tokens."""
+
+    __slots__ = ("exchanges", "tokens", "last_used")
+
+    def __init__(self):
+        self.exchanges = deque()  # (user_text, assistant_text, tokens), oldest first
+        self.tokens = 0
+        self.last_used = time.monotonic()
+
+    def append(self, user_text: str, assistant_text: str, max_tokens: int, max_exchanges: int) -> None:
+        tokens = estimate_tokens(user_text) + estimate_tokens(assistant_text)
+        self.exchanges.append((user_text, assistant_text, tokens))
+        self.tokens += tokens
+
+        # Drop whole exchanges from the front so user/assistant turns stay paired
+        while self.exchanges and (self.tokens > max_tokens or len(self.exchanges) > max_exchanges):
+            _, _, dropped = self.exchanges.popleft()
+            self.tokens -= dropped
+
+    def messages(self) -> list[dict]:
+        result = []
+        for user_text, assistant_text, _ in self.exchanges:
+            result.append({"role": "user", "content": user_text})
+            result.append({"role": "assistant", "content": assistant_text})
+        return result
+
+
+class ConversationStore:
+    """
+    Per-(guild, channel) conversation memory for EventParser.
+
+    Each channel keeps its own token-budgeted history, so unrelated servers never share
+    context. Idle channels are evicted least-recently-used first once max_channels is
+    reached or after idle_ttl seconds, which keeps memory bounded with many channels.
+    Safe to share between the LLM worker threads.
+    """
+
+    def __init__(self, max_tokens_per_channel: int = 1500, max_exchanges: int = 20,
+                 max_channels: int = 2000, idle_ttl: float = 6 * 3600):
+        self.max_tokens_per_channel = max_tokens_per_channel
+        self.max_exchanges = max_exchanges
+        self.max_channels = max_channels
+        self.idle_ttl = idle_ttl
+        self.channels = OrderedDict()  # {(guild_id, channel_id): ChannelContext}, least recently used first
+        self._lock = threading.Lock()
+
+    def messages(self, scope: tuple) -> list[dict]:
+        """Return the history for a channel as Anthropic message dicts (oldest first)."""
+        with self._lock:
+            context = self.channels.get(scope)
+            if context is None:
+                return []
+            if time.monotonic() - context.last_used > self.idle_ttl:
+                del self.channels[scope]
+                return []
+            return context.messages()
+
+    def record(self, scope: tuple, user_text: str, assistant_text: str) -> None:
+        """Append one user/assistant exchange to a channel's history."""
+        with self._lock:
+            context = self.channels.get(scope)
+            if context is None:
+                context = self.channels[scope] = ChannelContext()
+            else:
+                self.channels.move_to_end(scope)
+
+            context.last_used = time.monotonic()
+            context.append(user_text, assistant_text, self.max_tokens_per_channel, self.max_exchanges)
+            self._evict()
+
+    def tokens(self, scope: tuple) -> int:
+        with self._lock:
+            context = self.channels.get(scope)
+            return context.tokens if context else 0
+
+    def _evict(self) -> None:
+        """Drop idle and excess channels, oldest first. Called with the lock held."""
+        now = time.monotonic()
+        while self.channels:
+            scope, context = next(iter(self.channels.items()))
+            if len(self.channels) > self.max_channels or now - context.last_used > self.idle_ttl:
+                del self.channels[scope]
+            else:
+                break
@@ -1,33 +1,210 @@
+from startup_profile import startup
 import discord
 from discord.ext import commands
 from discord import app_commands
 import os
+import asyncio
+import signal
 from dotenv import load_dotenv
 import datetime
 import requests
+import hashlib
 from event_parser import EventParser
-from image_detection import imageDetection
+from message_batcher import MessageBatcher
+from face_pool import FaceDetectionPool
+from image_cache import FaceCountCache
+from message_log import MessageLogWriter
+from incomplete_store import IncompleteEventStore
+from llm_scheduler import LoadShed, USER, PASSIVE
+from sharding import ShardConfig
+from metrics import metrics
+from types import SimpleNamespace
+
+startup.mark('imports')
 
 # 1. Setup Intents (Permission to read messages)
 intents = discord.Intents.default()
 intents.message_content = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
-
-# Initialize event parser
-event_parser = EventParser()
-image_detection = imageDetection()
+# SHARD_COUNT / SHARD_IDS select the shards this process runs (see sharding.py and launcher.py)
+shards = ShardConfig.from_env()
+
+class SchedulerBot(commands.AutoShardedBot if shards.enabled else commands.Bot):
+    """Bot with startup/shutdown hooks for the background services below."""
+
+    async def setup_hook(self):
+        message_log.start()
+        metrics.start_lag_monitor()
+        # Client.run only turns Ctrl+C into a clean shutdown; the launcher and docker stop
+        # send SIGTERM, which would otherwise kill the process before close() flushes
+        try:
+            asyncio.get_running_loop().add_signal_handler(
+                signal.SIGTERM, lambda: asyncio.create_task(self.close()))
+        except NotImplementedError:
+            pass  # Windows event loops don't support signal handlers
+        if METRICS_PORT:
+            await metrics.serve(METRICS_HOST, METRICS_PORT)
+
+    closing = False
+
+    async def close(self):
+        # A second SIGTERM, or Client.run's own cleanup, must not flush closed services again
+        if self.closing:
+            return
+        self.closing = True
+        # Finish in-flight work and write out buffered log lines before disconnecting
+        await message_batcher.flush_all()
+        event_parser.log_stats(force=True)
+        await message_log.close()
+        await asyncio.to_thread(incomplete_events.close)
+        face_pool.shutdown()
+        await metrics.stop()
+        event_parser.scheduler.shutdown()
+        await super().close()
+
+bot = SchedulerBot(command_prefix="!", intents=intents, **shards.bot_kwargs())
+
+# Stateful services, created by setup_services() in the bot process only. Face detection
+# workers are spawned and re-import this module, and must not open the same state files.
+event_parser = None
+face_pool = None
+face_cache = None
+message_log = None
+incomplete_events = None
+message_batcher = None
+image_slots = None
 
 # Backend API URL
 BACKEND_URL = os.getenv('BACKEND_URL', 'http://localhost:5000')
 
-# Store incomplete events for threads
-incomplete_events = {}  # {thread_id: event_details}
+# Incomplete events expire with the thread's auto-archive
+THREAD_AUTO_ARCHIVE_MINUTES = 60
+
+# Messages whose images are waiting for face detection; photos beyond this are skipped
+FACE_MAX_PENDING = int(os.getenv('FACE_MAX_PENDING', '32'))
+
+# Keep references to fire-and-forget tasks so they aren't garbage collected mid-run
+background_tasks = set()
+image_tasks = set()
+
+# The event index is seeded from the backend on the first successful on_ready only; after
+# that it is kept current as events are scheduled, so reconnects don't reload it
+event_index_seeded = False
+
+# Load the Anthropic SDK and face models in the background once connected, rather than
+# on the first message. Either way none of it is on the path to connecting the gateway.
+WARM_UP_ON_READY = os.getenv('WARM_UP_ON_READY', 'true').lower() in ('1', 'true', 'yes')
+
+# Prometheus metrics on http://METRICS_HOST:METRICS_PORT/metrics (0 disables). Sharded
+# processes on one host each take the port offset by their first shard id.
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+if METRICS_PORT and shards.enabled:
+    METRICS_PORT += shards.shard_ids[0]
+
+def setup_services():
+    """Create the parser, caches, pools and stores the handlers below use."""
+    global event_parser, face_pool, face_cache, message_log, incomplete_events, message_batcher, image_slots
+
+    # Each process keeps its own state files, named after its shards
+    event_parser = EventParser(shards=shards)
+    face_pool = FaceDetectionPool(
+        workers=int(os.getenv('FACE_WORKERS', '2')),
+        queue_size=int(os.getenv('FACE_QUEUE_SIZE', '16')),
+        kind=os.getenv('FACE_POOL_KIND', 'process'),
+        max_side=int(os.getenv('FACE_MAX_IMAGE_SIDE', '640'))
+    )
+    # Images downloaded but not yet counted; held from before the download, so a burst
+    # of photos waits here instead of sitting in memory in front of the pool
+    image_slots = asyncio.Semaphore(face_pool.workers + face_pool.queue_size)
+    face_cache = FaceCountCache(
+        max_entries=int(os.getenv('IMAGE_CACHE_MAX_ENTRIES', '5000')),
+        max_distance=int(os.getenv('IMAGE_CACHE_MAX_DISTANCE', '6')),
+        path=shards.path(os.getenv('IMAGE_CACHE_PATH') or None)
+    )
+
+    # Message log, written in batches from a background task and rotated by size
+    message_log = MessageLogWriter(
+        path=shards.path(os.getenv('MESSAGE_LOG_PATH', 'text_log.txt')),
+        max_bytes=int(os.getenv('MESSAGE_LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+        backups=int(os.getenv('MESSAGE_LOG_BACKUPS', '5')),
+        compress=os.getenv('MESSAGE_LOG_COMPRESS', '').lower() in ('1', 'true', 'yes')
+    )
+
+    # Store incomplete events for threads
+    incomplete_events = IncompleteEventStore(
+        max_entries=int(os.getenv('INCOMPLETE_EVENTS_MAX', '1000')),
+        path=shards.path(os.getenv('INCOMPLETE_EVENTS_PATH') or None)
+    )
+
+    # Collects bursts of messages per channel; BATCH_MAX_WAIT_SECONDS caps the added latency
+    message_batcher = MessageBatcher(
+        process_message_batch,
+        quiet=float(os.getenv('BATCH_QUIET_SECONDS', '0.75')),
+        max_wait=float(os.getenv('BATCH_MAX_WAIT_SECONDS', '2.0')),
+        max_batch=int(os.getenv('BATCH_MAX_MESSAGES', '8'))
+    )
+
+    metrics.gauge('bot_queue_depth', lambda: message_batcher.depth, queue='message_batcher')
+    metrics.gauge('bot_queue_depth', lambda: face_pool.in_flight, queue='face_pool')
+    metrics.gauge('bot_queue_depth', lambda: len(image_tasks), queue='face_detection')
+    metrics.gauge('bot_queue_depth', lambda: event_parser.scheduler.depth(USER), queue='llm_user')
+    metrics.gauge('bot_queue_depth', lambda: event_parser.scheduler.depth(PASSIVE), queue='llm_passive')
+    metrics.gauge('bot_queue_depth', lambda: len(message_log.pending), queue='message_log')
+    metrics.gauge('bot_queue_depth', lambda: len(incomplete_events), queue='incomplete_events')
+    metrics.gauge('bot_queue_depth', lambda: len(background_tasks), queue='background_tasks')
+
+    startup.mark('setup')
+
+def get_scope(message) -> tuple:
+    """Return the (guild_id, channel_id) an event posted from this message belongs to."""
+    guild = getattr(message.channel, 'guild', None)
+    return (guild.id if guild else None, message.channel.id)
+
+def fetch_planned_socials() -> list[dict]:
+    """Fetch this process's planned socials from the backend (blocking)."""
+    response = requests.get(f'{BACKEND_URL}/api/socials', params={'status': 'planned'}, timeout=10)
+    response.raise_for_status()
+    # Only this process's guilds - the other shards' processes index theirs
+    return [s for s in response.json() if shards.owns(s.get('guild_id'))]
+
+async def seed_event_index():
+    """
+    Load upcoming socials from the backend into the local dedup index, once.
+    The request runs in a thread; the index itself is only touched on the event loop,
+    where find_duplicate() reads it.
+    """
+    global event_index_seeded
+    if event_index_seeded:
+        return
+    try:
+        socials = await asyncio.to_thread(fetch_planned_socials)
+        if event_index_seeded:
+            return
+        added = event_parser.event_index.seed_from_socials(socials)
+        event_index_seeded = True
+        print(f"Seeded event index with {added} planned socials ({shards.label})", flush=True)
+    except Exception as e:
+        print(f"Error seeding event index: {e}", flush=True)
 
 @bot.event
 async def on_ready():
-    print(f'Logged in as {bot.user.name} (ID: {bot.user.id})')
+    print(f'Logged in as {bot.user.name} (ID: {bot.user.id}), {shards.label}')
     print('------')
+    if startup.mark('ready'):
+        if WARM_UP_ON_READY:
+            task = asyncio.create_task(warm_up())
+            background_tasks.add(task)
+            task.add_done_callback(background_tasks.discard)
+    await seed_event_index()
+
+async def warm_up():
+    """Import and initialise the heavy dependencies before the first message needs them."""
+    try:
+        await asyncio.gather(asyncio.to_thread(event_parser.warm_up), face_pool.warm_up())
+        startup.mark('warm')
+    except Exception as e:
+        print(f"Error warming up: {e}", flush=True)
 
 @bot.event
 async def on_message(message):
@@ -35,59 +212,136 @@ async def on_message(message):
     if message.author == bot.user:
         return
 
-    # Format the log entry
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"[{timestamp}] {message.guild} | #{message.channel} | {message.author}: {message.content}\n"
+    with metrics.span('on_message'):
+        # Format the log entry
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        log_entry = f"[{timestamp}] {message.guild} | #{message.channel} | {message.author}: {message.content}\n"
+
+        # Queue for the background log writer
+        message_log.write(log_entry)
+
+        # Check if we're in a thread with incomplete event info
+        if isinstance(message.channel, discord.Thread):
+            incomplete_event = incomplete_events.get(message.channel.id)
+            if incomplete_event:
+                # Any reply shows the thread is still active, whether or not it fills a gap
+                incomplete_events.touch(message.channel.id)
+                metrics.count('bot_messages_total', path='thread')
+                with metrics.span('thread_response'):
+                    await process_thread_response(message, incomplete_event)
+                return
+
+        images = [a for a in message.attachments if a.content_type and a.content_type.startswith('image')]
+        if images:
+            if len(image_tasks) >= FACE_MAX_PENDING:
+                # Shed rather than queue without bound; the text is still classified
+                metrics.count('bot_images_skipped_total', len(images))
+                print(f"Face detection backlog full, skipping {len(images)} image(s)", flush=True)
+            else:
+                # Run face detection in the background so classification isn't held up by it
+                task = asyncio.create_task(detect_faces(message, images))
+                background_tasks.add(task)
+                image_tasks.add(task)
+                task.add_done_callback(background_tasks.discard)
+                task.add_done_callback(image_tasks.discard)
+
+        # Queue the message for batched event classification in this channel
+        if message.content.strip():
+            metrics.count('bot_messages_total', path='batched')
+            await message_batcher.submit(message)
+        else:
+            metrics.count('bot_messages_total', path='no_text')
 
-    # Save to a text file
-    with open("text_log.txt", "a", encoding="utf-8") as f:
-        f.write(log_entry)
+        # Still allow commands to work if you add them later
+        await bot.process_commands(message)
 
-    # Check if we're in a thread with incomplete event info
-    if isinstance(message.channel, discord.Thread):
-        if message.channel.id in incomplete_events:
-            await process_thread_response(message, incomplete_events[message.channel.id])
-            return
+    if startup.mark('first_message'):
+        # report() may append to STARTUP_PROFILE_PATH, so keep the file write off the loop
+        await asyncio.to_thread(startup.report)
+
+async def count_faces_cached(attachment) -> int:
+    """
+    Count faces in an attachment, skipping work for images seen before: the same
+    attachment skips the download, and identical or perceptually similar bytes skip inference.
+    """
+    face_count = face_cache.get_by_attachment(attachment.id, attachment.size)
+    if face_count is not None:
+        return face_count
+
+    async with image_slots:
+        # Decode straight from the downloaded bytes - no temp file on disk
+        image_bytes = await attachment.read()
+        content_hash = hashlib.sha256(image_bytes).hexdigest()
+
+        face_count = face_cache.get_by_content(content_hash)
+        phash = None
+        if face_count is None:
+            phash = await face_pool.perceptual_hash(image_bytes)
+            face_count = face_cache.get_similar(phash)
+        if face_count is None:
+            face_count = await face_pool.count_faces(image_bytes)
+
+    face_cache.put(content_hash, face_count, phash=phash, attachment_id=attachment.id, size=attachment.size)
+    return face_count
+
+async def detect_faces(message: discord.Message, attachments: list):
+    """Count faces in all image attachments of a message concurrently, on the worker pool."""
+    async def process(attachment):
+        try:
+            with metrics.span('face_detection'):
+                face_count = await count_faces_cached(attachment)
+            if face_count > 0:
+                await message.channel.send(f"Found **{face_count}** face(s) in that photo! 👤")
+        except Exception as e:
+            print(f"Error processing image: {e}")
+
+    await asyncio.gather(*(process(attachment) for attachment in attachments))
+
+async def call_llm(func, *args, priority=PASSIVE, **kwargs):
+    """
+    Run a blocking EventParser call on the scheduler's threads for the given lane,
+    so waiting on the API (or on the rate limiter) never stalls the event loop and
+    passive work can't take the threads user-initiated calls need.
+    """
+    return await event_parser.scheduler.run_in_thread(func, *args, priority=priority, **kwargs)
 
-    if message.attachments:
-        for attachment in message.attachments:
-            if attachment.content_type and attachment.content_type.startswith('image'):
-                temp_filename = f"temp_{message.id}_{attachment.filename}"
-                try:
-                    await attachment.save(temp_filename)
-                    face_count = image_detection.count_faces(temp_filename)
-                    if face_count > 0:
-                        await message.channel.send(f"Found **{face_count}** face(s) in that photo! 👤")
-                except Exception as e:
-                    print(f"Error processing image: {e}")
-                finally:
-                    if os.path.exists(temp_filename):
-                        os.remove(temp_filename)
-                        
-    # Check if message is about scheduling an event
+async def process_message_batch(messages: list):
+    """Classify a burst of messages from one channel and schedule each detected event."""
     try:
-        event_details = event_parser.parse_event_message(message.content)
+        guild_id, channel_id = get_scope(messages[0])
+        with metrics.message_usage(len(messages)), metrics.span('batch_llm'):
+            detections = await call_llm(
+                event_parser.classify_batch,
+                [m.content for m in messages],
+                authors=[m.author.name for m in messages],
+                guild_id=guild_id,
+                channel_id=channel_id
+            )
+
+        for event_details in detections:
+            # Attribute the event back to the message that proposed it
+            source = messages[event_details.pop('message_index')]
 
-        if event_details:
             # Check if this is a duplicate of a recent event
-            is_duplicate = await check_duplicate_event(message, event_details)
+            with metrics.span('dedup'):
+                is_duplicate = await check_duplicate_event(source, event_details)
             if not is_duplicate:
-                await handle_event_scheduling(message, event_details)
+                with metrics.span('handle_event_scheduling'):
+                    await handle_event_scheduling(source, event_details)
+    except LoadShed as e:
+        print(f"Skipping batch classification: {e}", flush=True)
     except Exception as e:
         print(f"Error processing event message: {e}")
 
-    # Still allow commands to work if you add them later
-    await bot.process_commands(message)
-
 async def check_duplicate_event(message: discord.Message, event_details: dict) -> bool:
     """
     Check if this event is a duplicate of a recently scheduled event.
-    Uses Claude's agent context/conversation history to determine this.
+    Uses the parser's local event index for this guild/channel.
     Returns True if it's a duplicate (should skip scheduling), False otherwise.
     """
     try:
-        # Use Claude with its conversation history to check for duplicates
-        is_duplicate = event_parser.check_event_similarity(event_details)
+        guild_id, channel_id = get_scope(message)
+        is_duplicate = event_parser.check_event_similarity(event_details, guild_id=guild_id, channel_id=channel_id)
 
         if is_duplicate:
             await message.channel.send(
@@ -115,10 +369,13 @@ async def process_thread_response(message: discord.Message, incomplete_event: di
         print(f"Processing thread response: {message.content[:50]}...", flush=True)
 
         # Use Claude to extract the missing information
-        extracted_info = event_parser.extract_event_info_from_thread(
-            message.content,
-            missing_fields
-        )
+        with metrics.message_usage(), metrics.span('thread_llm'):
+            extracted_info = await call_llm(
+                event_parser.extract_event_info_from_thread,
+                message.content,
+                missing_fields,
+                priority=USER
+            )
 
         if extracted_info:
             # Update the event details with extracted info
@@ -134,24 +391,28 @@ async def process_thread_response(message: discord.Message, incomplete_event: di
                 current_missing.append('location')
 
             if not current_missing:
-                # All info is now complete - create the event!
-                class MockMessage:
-                    def __init__(self, original_msg):
-                        self.author = original_msg.author
-                        self.content = original_msg.content
-                        self.channel = original_msg.channel
-
-                mock_msg = MockMessage(incomplete_event['original_message'])
-                await handle_event_scheduling(mock_msg, event_details)
-
-                await message.channel.send("✅ Got it! Event created with all the info you provided!")
+                # All info is now complete - create the event as if from the original message
+                channel = message.channel.parent or bot.get_channel(incomplete_event['channel_id'])
+                mock_msg = SimpleNamespace(
+                    author=SimpleNamespace(id=incomplete_event['author_id'], name=incomplete_event['author_name']),
+                    content=incomplete_event['content'],
+                    channel=channel
+                )
+                with metrics.span('handle_event_scheduling'):
+                    await handle_event_scheduling(mock_msg, event_details)
+
+                with metrics.span('thread_reply'):
+                    await message.channel.send("✅ Got it! Event created with all the info you provided!")
 
                 # Clean up
-                del incomplete_events[message.channel.id]
+                incomplete_events.remove(message.channel.id)
             else:
-                # Still missing some info
+                # Still missing some info - save progress
+                incomplete_event['missing_fields'] = current_missing
+                incomplete_events.touch(message.channel.id)
                 still_missing = ", ".join(current_missing)
-                await message.channel.send(f"⚠️ Thanks! I still need: **{still_missing}**")
+                with metrics.span('thread_reply'):
+                    await message.channel.send(f"⚠️ Thanks! I still need: **{still_missing}**")
         else:
             await message.channel.send("❓ I couldn't extract event info from that message. Could you be more specific?")
 
@@ -173,10 +434,12 @@ async def handle_event_scheduling(message: discord.Message, event_details: dict)
 
         # If missing critical info, ask for it
         if missing_fields:
-            await ask_for_missing_info(message, event_details, missing_fields)
+            with metrics.span('ask_missing_info'):
+                await ask_for_missing_info(message, event_details, missing_fields)
             return
 
         # Create event in backend
+        guild_id, channel_id = get_scope(message)
         event_data = {
             'name': event_details.get('name', 'New Event'),
             'description': event_details.get('description', ''),
@@ -184,10 +447,13 @@ async def handle_event_scheduling(message: discord.Message, event_details: dict)
             'event_date': event_details.get('event_date', ''),
             'created_by': message.author.id,
             'created_by_username': message.author.name,
+            'guild_id': guild_id,
+            'channel_id': channel_id,
             'status': 'planned'
         }
 
-        response = requests.post(f'{BACKEND_URL}/api/socials', json=event_data)
+        with metrics.span('backend_post'):
+            response = requests.post(f'{BACKEND_URL}/api/socials', json=event_data)
 
         if response.status_code == 201:
             event_response = response.json()
@@ -208,11 +474,13 @@ async def handle_event_scheduling(message: discord.Message, event_details: dict)
             embed.add_field(name="RSVP", value=f"[Click here to schedule your availability]({invite_link})", inline=False)
             embed.set_footer(text=f"Created by {message.author.name}")
 
-            await message.channel.send(embed=embed)
+            with metrics.span('discord_send'):
+                await message.channel.send(embed=embed)
             print(f"Event created: {event_details.get('name')} (ID: {event_id})")
 
-            # Add to agent context - tell Claude about this scheduled event for deduplication
-            event_parser.add_to_agent_context(event_details)
+            # Add to agent context and the dedup index for this guild/channel
+            with metrics.span('agent_context'):
+                event_parser.add_to_agent_context(event_details, guild_id=guild_id, channel_id=channel_id, social_id=event_id)
         else:
             await message.channel.send(f"❌ Error creating event: {response.status_code}")
             print(f"Error creating event: {response.status_code} - {response.text}")
@@ -227,7 +495,7 @@ async def ask_for_missing_info(message: discord.Message, event_details: dict, mi
         # Create thread for collecting info
         thread = await message.create_thread(
             name=f"📋 Event Details for {event_details.get('name', 'Event')}",
-            auto_archive_duration=60
+            auto_archive_duration=THREAD_AUTO_ARCHIVE_MINUTES
         )
 
         missing_str = ", ".join(missing_fields)
@@ -251,13 +519,17 @@ async def ask_for_missing_info(message: discord.Message, event_details: dict, mi
         await thread.send(embed=embed)
         await message.channel.send(f"✋ I need more info! Check the thread: {thread.mention}")
 
-        # Store the incomplete event data for later completion
-        incomplete_events[thread.id] = {
-            'original_author': message.author,
-            'original_message': message,
+        # Store the incomplete event data for later completion - ids and fields only
+        guild_id, channel_id = get_scope(message)
+        incomplete_events.put(thread.id, {
+            'guild_id': guild_id,
+            'channel_id': channel_id,
+            'author_id': message.author.id,
+            'author_name': message.author.name,
+            'content': message.content,
             'event_details': event_details,
             'missing_fields': missing_fields
-        }
+        }, ttl=THREAD_AUTO_ARCHIVE_MINUTES * 60)
         print(f"Created thread {thread.id} for incomplete event", flush=True)
 
     except Exception as e:
@@ -280,10 +552,17 @@ async def teach_schedule(ctx):
         message_content = replied_to.content
 
         # Learn from this correction - add it to conversation history as a scheduling message
+        guild_id, channel_id = get_scope(replied_to)
         event_parser.learn_scheduling_pattern(message_content)
 
         # Automatically process it as an event
-        event_details = event_parser.parse_event_message(message_content)
+        event_details = await call_llm(
+            event_parser.parse_event_message,
+            message_content,
+            guild_id=guild_id,
+            channel_id=channel_id,
+            priority=USER
+        )
 
         if event_details:
             # Create a mock message object for handle_event_scheduling
@@ -304,10 +583,16 @@ async def teach_schedule(ctx):
         await ctx.send(f"❌ Error: {str(e)}")
 
 # 2. Start the bot
-# Load the variables from .env into the system environment
-load_dotenv()
-
-# Retrieve the token
-TOKEN = os.getenv('DISCORD_KEY')
-
-bot.run(TOKEN)
+def main():
+    # Load the variables from .env into the system environment
+    load_dotenv()
+    setup_services()
+
+    # Retrieve the token
+    TOKEN = os.getenv('DISCORD_KEY')
+    bot.run(TOKEN)
+
+# Guarded so face detection worker processes (spawned, so they re-import this module) only
+# get the definitions above: no services, state files or bot run
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+import re
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+
+# Words that say nothing about *which* event it is ("Coffee Meetup" vs "Coffee Hangout")
+GENERIC_WORDS = {
+    "a", "an", "the", "and", "at", "to", "for", "with", "of", "in", "on",
+    "meetup", "meet", "hangout", "hang", "event", "social", "session",
+    "gathering", "party", "time", "night", "out", "get", "together",
+}
+
+
+def normalize_text(text: str | None) -> str:
+    """Lowercase, strip punctuation and collapse whitespace."""
+    if not text:
+        return ""
+    text = text.lower().replace("'", "")
+    return " ".join(re.findall(r"[a-z0-9]+", text))
+
+
+def name_tokens(name: str | None) -> list[str]:
+    """Normalized, order-independent tokens of an event name."""
+    tokens = [t for t in normalize_text(name).split() if t not in GENERIC_WORDS]
+    if not tokens:
+        # Name was nothing but generic words - keep them rather than match everything
+        tokens = normalize_text(name).split()
+    return sorted(set(tokens))
+
+
+def trigrams(tokens: list[str]) -> frozenset[str]:
+    """Character trigrams of each token, padded so short words still match."""
+    grams = set()
+    for token in tokens:
+        padded = f"  {token} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return frozenset(grams)
+
+
+def parse_event_date(value) -> datetime | None:
+    """
+    Parse an event date as sent to or returned by the backend.
+    Accepts ISO 8601 (what the bot sends) and RFC 1123 (what Flask's jsonify returns).
+    Returns a naive UTC datetime, or None if it can't be parsed.
+    """
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value))
+        except ValueError:
+            try:
+                parsed = parsedate_to_datetime(str(value))
+            except (TypeError, ValueError):
+                return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class IndexedEvent:
+    """A scheduled event as stored in the dedup index."""
+
+    __slots__ = ("key", "name", "location", "event_date", "grams", "added_at")
+
+    def __init__(self, key, name, location, event_date, grams, added_at):
+        self.key = key
+        self.name = name
+        self.location = location
+        self.event_date = event_date
+        self.grams = grams
+        self.added_at = added_at
+
+
+class EventScope:
+    """Recent events for one (guild, channel), with a trigram -> event inverted index."""
+
+    def __init__(self, max_events: int):
+        self.max_events = max_events
+        self.events = OrderedDict()  # {key: IndexedEvent}, oldest first
+        self.postings = defaultdict(set)  # {trigram: {key, ...}}
+
+    def add(self, event: IndexedEvent) -> None:
+        if event.key in self.events:
+            self.remove(event.key)
+        self.events[event.key] = event
+        for gram in event.grams:
+            self.postings[gram].add(event.key)
+        while len(self.events) > self.max_events:
+            self.remove(next(iter(self.events)))
+
+    def remove(self, key) -> None:
+        event = self.events.pop(key, None)
+        if event is None:
+            return
+        for gram in event.grams:
+            keys = self.postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.postings[gram]
+
+    def candidates(self, grams: frozenset[str]) -> dict:
+        """Count shared trigrams for every event sharing at least one with the query."""
+        shared = defaultdict(int)
+        for gram in grams:
+            for key in self.postings.get(gram, ()):
+                shared[key] += 1
+        return shared
+
+
+class EventIndex:
+    """
+    Local index of recently scheduled events, used for duplicate detection.
+
+    Events are grouped per (guild_id, channel_id). A new event is a duplicate of an
+    indexed one when the names are similar (trigram Jaccard over normalized tokens),
+    the locations don't contradict each other, and the times fall within a window.
+    Not thread-safe: the bot reads and writes it from the event loop only.
+    """
+
+    def __init__(self, max_events_per_scope: int = 200, name_threshold: float = 0.5,
+                 time_window_hours: float = 6, retention_days: float = 14):
+        self.max_events_per_scope = max_events_per_scope
+        self.name_threshold = name_threshold
+        self.time_window = timedelta(hours=time_window_hours)
+        self.retention = timedelta(days=retention_days)
+        self.scopes = {}  # {(guild_id, channel_id): EventScope}
+        self._next_key = 0
+
+    def add(self, event: dict, guild_id=None, channel_id=None, social_id=None,
+            added_at: float | None = None) -> None:
+        """
+        Index a scheduled event. Re-adding the same backend social_id replaces the
+        existing entry, so seeding twice (e.g. on reconnect) is harmless.
+        `added_at` (epoch seconds, default now) is when the event was scheduled and
+        starts its retention period.
+        """
+        tokens = name_tokens(event.get("name"))
+        if not tokens:
+            return
+
+        if social_id is None:
+            self._next_key += 1
+            key = ("local", self._next_key)
+        else:
+            key = ("social", social_id)
+
+        scope = self.scopes.get((guild_id, channel_id))
+        if scope is None:
+            scope = self.scopes[(guild_id, channel_id)] = EventScope(self.max_events_per_scope)
+
+        scope.add(IndexedEvent(
+            key=key,
+            name=event.get("name"),
+            location=normalize_text(event.get("location")),
+            event_date=parse_event_date(event.get("event_date")),
+            grams=trigrams(tokens),
+            added_at=time.time() if added_at is None else added_at,
+        ))
+
+    def find_duplicate(self, event: dict, guild_id=None, channel_id=None) -> IndexedEvent | None:
+        """Return the indexed event this one duplicates, or None."""
+        scope = self.scopes.get((guild_id, channel_id))
+        if scope is None:
+            return None
+
+        grams = trigrams(name_tokens(event.get("name")))
+        if not grams:
+            return None
+
+        location = normalize_text(event.get("location"))
+        event_date = parse_event_date(event.get("event_date"))
+        cutoff = time.time() - self.retention.total_seconds()
+
+        best, best_score = None, 0.0
+        for key, shared in scope.candidates(grams).items():
+            candidate = scope.events[key]
+            if candidate.added_at < cutoff:
+                continue
+
+            score = shared / (len(grams) + len(candidate.grams) - shared)
+            if score < self.name_threshold or score <= best_score:
+                continue
+
+            if location and candidate.location and not self._locations_match(location, candidate.location):
+                continue
+
+            if event_date and candidate.event_date and abs(event_date - candidate.event_date) > self.time_window:
+                continue
+
+            best, best_score = candidate, score
+
+        return best
+
+    @staticmethod
+    def _locations_match(a: str, b: str) -> bool:
+        return a == b or a in b or b in a
+
+    def seed_from_socials(self, socials: list[dict]) -> int:
+        """
+        Index socials as returned by the backend's GET /api/socials. Returns how many were added.
+
+        Each social keeps its own created_at as its index time, so it expires on the same
+        schedule as if it had been indexed when created. Socials past their retention, and
+        ones that happened too long ago for any new plan to fall in their time window, are skipped.
+        """
+        cutoff = time.time() - self.retention.total_seconds()
+        earliest_date = datetime.now() - self.time_window
+        added = 0
+        for social in socials:
+            if social.get("status") not in (None, "planned", "ongoing"):
+                continue
+
+            event_date = parse_event_date(social.get("event_date"))
+            if event_date is not None and event_date < earliest_date:
+                continue
+
+            created_at = parse_event_date(social.get("created_at"))
+            added_at = created_at.replace(tzinfo=timezone.utc).timestamp() if created_at else None
+            if added_at is not None and added_at < cutoff:
+                continue
+
+            self.add(
+                social,
+                guild_id=social.get("guild_id"),
+                channel_id=social.get("channel_id"),
+                social_id=social.get("id"),
+                added_at=added_at,
+            )
+            added += 1
+        return added
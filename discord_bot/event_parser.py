@@ -2,33 +2,24 @@ import re
 import os
 import json
 import sys
-from anthropic import Anthropic
+import time
+import hashlib
+import threading
 from datetime import datetime, timedelta
+from event_index import EventIndex
+from conversation_store import ConversationStore
+from response_cache import ResponseCache
+from model_router import ModelRouter
+from startup_profile import startup
+from metrics import metrics
+from llm_scheduler import LLMScheduler, LoadShed
+from structured_output import CLASSIFY_TOOL, CLASSIFY_BATCH_TOOL, CLASSIFY_TOOLS, EXTRACT_TOOL, tool_call
 
-class EventParser:
-    """Parse Discord messages for event scheduling using Claude."""
-
-    def __init__(self):
-        self.client = Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
-        self.conversation_history = []  # For agentic memory
-        self.scheduling_examples = []  # Store examples of scheduling patterns
+# Stable instructions for llm_check(). These go in the cached system prefix, so
+# keep them byte-identical between calls - anything per-message belongs in the user turn.
+CLASSIFY_INSTRUCTIONS = """You analyze Discord messages to determine if they are someone suggesting, proposing, or trying to schedule a social activity, event, or gathering (including informal plans like getting coffee, lunch, drinks, etc.).
 
-    def llm_check(self, content: str) -> dict | None:
-        """
-        Use Claude to determine if this is an event scheduling message
-        and extract the event details if it is.
-
-        Returns:
-            dict with keys: name, location, description, datetime_hint, is_event
-            None if LLM decides it's not an event scheduling message
-        """
-        try:
-            # Add user message to conversation history
-            self.conversation_history.append({
-                "role": "user",
-                "content": f"""Analyze this Discord message to determine if it's someone suggesting, proposing, or trying to schedule a social activity, event, or gathering (including informal plans like getting coffee, lunch, drinks, etc.).
-
-Message: "{content}"
+Each user turn contains one Discord message in the form: Message: "<text>". Earlier turns are recent messages from the same channel and can help you understand follow-ups.
 
 Be inclusive - if there's any mention of wanting to do something social with others or at a specific time, consider it an event.
 
@@ -37,7 +28,7 @@ IMPORTANT: Always generate a meaningful name/title for the activity based on wha
 - "go to mcdonalds" -> name should be "McDonald's Hangout"
 - Never return null for name if is_event is true - create a descriptive title from the message content
 
-Respond with a JSON object containing:
+Record each classification with the record_classification tool (for a numbered batch of messages, record_classifications, with one entry per event), filling in:
 - "is_event": boolean (true if this is about planning/suggesting any social activity)
 - "name": string (name/title of the activity - REQUIRED if is_event is true, generate from message content)
 - "location": string (location mentioned, or null)
@@ -45,44 +36,252 @@ Respond with a JSON object containing:
 - "datetime_hint": string (any date/time mentioned, or null)
 - "confidence": number (0-1, confidence this is a social activity/event planning message)
 
-Only return valid JSON, no other text."""
-            })
+Examples (each message, then the values to record for it):
 
-            response = self.client.messages.create(
-                model="claude-opus-4-1-20250805",
-                max_tokens=500,
-                messages=self.conversation_history
-            )
+Message: "anyone want to grab lunch at the canteen at 1?"
+{"is_event": true, "name": "Canteen Lunch", "location": "the canteen", "description": "Lunch together at the canteen", "datetime_hint": "today at 1pm", "confidence": 0.95}
 
-            response_text = response.content[0].text.strip()
+Message: "wanna get coffee"
+{"is_event": true, "name": "Coffee Meetup", "location": null, "description": "Getting coffee together", "datetime_hint": null, "confidence": 0.8}
 
-            print(f"Raw Claude response: '{response_text}'", flush=True)
+Message: "movie night this friday at mine, 8pm"
+{"is_event": true, "name": "Movie Night", "location": "my place", "description": "Watching movies together", "datetime_hint": "this Friday at 8pm", "confidence": 0.95}
 
-            # Strip markdown code blocks if present
-            if response_text.startswith("```"):
-                # Remove opening ```json or ```
-                response_text = response_text.split('\n', 1)[1] if '\n' in response_text else response_text
-                # Remove closing ```
-                if response_text.endswith("```"):
-                    response_text = response_text[:-3].rstrip()
+Message: "who's down for the pub after the lecture tomorrow"
+{"is_event": true, "name": "Pub After Lecture", "location": "the pub", "description": "Drinks after the lecture", "datetime_hint": "tomorrow after the lecture", "confidence": 0.9}
 
-            # Add assistant response to history for memory
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": response.content[0].text.strip()  # Store original response
-            })
+Message: "let's do a board games evening next week, I'll bring catan"
+{"is_event": true, "name": "Board Games Evening", "location": null, "description": "Board games, bringing Catan", "datetime_hint": "next week, evening", "confidence": 0.9}
 
-            # Keep conversation history manageable (last 20 exchanges)
-            if len(self.conversation_history) > 40:
-                self.conversation_history = self.conversation_history[-40:]
+Message: "football in hyde park saturday morning?"
+{"is_event": true, "name": "Football in Hyde Park", "location": "Hyde Park", "description": "Casual football game", "datetime_hint": "Saturday morning", "confidence": 0.9}
 
-            # Parse JSON response
-            try:
-                result = json.loads(response_text)
-            except json.JSONDecodeError as je:
-                print(f"JSON parsing error: {je}", flush=True)
-                print(f"Response was: {response_text}", flush=True)
-                return None
+Message: "did anyone finish the coursework?"
+{"is_event": false, "name": null, "location": null, "description": null, "datetime_hint": null, "confidence": 0.05}
+
+Message: "lol that's so true"
+{"is_event": false, "name": null, "location": null, "description": null, "datetime_hint": null, "confidence": 0.02}
+
+Message: "I had coffee with my sister yesterday"
+{"is_event": false, "name": null, "location": null, "description": null, "datetime_hint": null, "confidence": 0.1}
+
+Message: "the lecture is moved to room 311 tomorrow"
+{"is_event": false, "name": null, "location": null, "description": null, "datetime_hint": null, "confidence": 0.15}"""
+
+MAX_LEARNED_EXAMPLES = 50
+
+# Cached answer for a batch message that no detection pointed at
+NOT_AN_EVENT = {"is_event": False, "name": None, "location": None, "description": None,
+                "datetime_hint": None, "confidence": 0.0}
+
+# Bump when a prompt changes meaning, so cached responses from the old prompt are ignored
+PROMPT_VERSION = "1"
+
+
+class PromptCacheStats:
+    """Running totals of prompt-cache usage, from the usage block of each response."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.cache_hits = 0  # calls that read at least part of the prompt from cache
+        self.input_tokens = 0  # uncached input tokens
+        self.cache_read_tokens = 0
+        self.cache_write_tokens = 0
+
+    def record(self, usage) -> None:
+        if usage is None:
+            return
+        read = getattr(usage, 'cache_read_input_tokens', 0) or 0
+        with self._lock:
+            self.calls += 1
+            self.cache_hits += 1 if read else 0
+            self.input_tokens += getattr(usage, 'input_tokens', 0) or 0
+            self.cache_read_tokens += read
+            self.cache_write_tokens += getattr(usage, 'cache_creation_input_tokens', 0) or 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of calls that were served (at least partly) from the prompt cache."""
+        return self.cache_hits / self.calls if self.calls else 0.0
+
+    @property
+    def cached_token_ratio(self) -> float:
+        """Share of all prompt tokens that were read from cache."""
+        total = self.input_tokens + self.cache_read_tokens + self.cache_write_tokens
+        return self.cache_read_tokens / total if total else 0.0
+
+    def summary(self) -> str:
+        return (f"prompt cache: {self.cache_hits}/{self.calls} calls hit ({self.hit_rate:.0%}), "
+                f"{self.cached_token_ratio:.0%} of prompt tokens from cache")
+
+
+class EventParser:
+    """Parse Discord messages for event scheduling using Claude."""
+
+    def __init__(self, shards=None):
+        """
+        `shards` (a sharding.ShardConfig) gives a sharded process its own cache file
+        and its share of the account-wide LLM rate limits.
+        """
+        share = shards.share if shards is not None else 1.0
+        self.scheduler = LLMScheduler(
+            requests_per_minute=float(os.getenv('LLM_REQUESTS_PER_MINUTE', '50')) * share,
+            tokens_per_minute=float(os.getenv('LLM_TOKENS_PER_MINUTE', '50000')) * share,
+            max_passive_queue=int(os.getenv('LLM_MAX_PASSIVE_QUEUE', '8')),
+            user_threads=int(os.getenv('LLM_USER_THREADS', '4')),
+            passive_threads=int(os.getenv('LLM_PASSIVE_THREADS', '4'))
+        )
+        # Routes each task to a model tier; unsure or unparseable answers escalate to the large tier
+        self.router = ModelRouter(self._make_client, scheduler=self.scheduler)
+        self.escalate_confidence = (
+            float(os.getenv('LLM_ESCALATE_MIN_CONFIDENCE', '0.35')),
+            float(os.getenv('LLM_ESCALATE_MAX_CONFIDENCE', '0.65'))
+        )
+        # Per-(guild, channel) agentic memory, bounded by tokens and channel count
+        self.conversations = ConversationStore(
+            max_tokens_per_channel=int(os.getenv('CONTEXT_TOKENS_PER_CHANNEL', '1500')),
+            max_channels=int(os.getenv('CONTEXT_MAX_CHANNELS', '2000'))
+        )
+        self.scheduling_examples = []  # Store examples of scheduling patterns
+        self.event_index = EventIndex(
+            time_window_hours=float(os.getenv('DEDUP_TIME_WINDOW_HOURS', '6')),
+            name_threshold=float(os.getenv('DEDUP_NAME_THRESHOLD', '0.5'))
+        )
+        self.cache_stats = PromptCacheStats()
+        self.prefix_tokens = None  # Classification prefix size, from check_prompt_cache()
+        self.cache_note = None  # Why prompt caching isn't taking effect, if it isn't
+        # Usage summaries are printed at most this often rather than after every call
+        self.stats_interval = float(os.getenv('LLM_STATS_LOG_SECONDS', '300'))
+        self._stats_logged_at = time.monotonic()
+        self._system_prompt = None  # Built lazily, rebuilt when scheduling_examples change
+        self._classify_version = None  # Cache key version of the current system prompt
+        # Parser methods run on several LLM worker threads at once (see LLMScheduler.run_in_thread)
+        self._prompt_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        cache_path = os.getenv('LLM_CACHE_PATH', 'llm_cache.sqlite3') or None
+        if shards is not None:
+            cache_path = shards.path(cache_path)
+        self.response_cache = ResponseCache(
+            path=cache_path,
+            max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', '10000')),
+            ttl=float(os.getenv('LLM_CACHE_TTL_HOURS', '168')) * 3600
+        )
+
+    @staticmethod
+    def _make_client():
+        anthropic = startup.lazy_import('anthropic')
+        # Retries are left to the scheduler, which knows about every other request in flight
+        return anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'), max_retries=0)
+
+    @property
+    def client(self):
+        """The Anthropic client, created on first use."""
+        return self.router.client
+
+    def warm_up(self) -> None:
+        """Load the Anthropic SDK and build the client ahead of the first message."""
+        self.router.warm_up()
+        self.check_prompt_cache()
+
+    def check_prompt_cache(self) -> int | None:
+        """
+        Measure the cached classification prefix (tool definitions plus system prompt)
+        with the token counting endpoint, and warn for each model classification runs on
+        (routed and escalation) whose caching minimum it doesn't reach.
+        Returns its size in tokens, or None if it couldn't be counted.
+        """
+        model = self.router.model_for('classify')
+        probe = [{"role": "user", "content": 'Message: "hi"'}]
+        try:
+            with_prefix = self.client.messages.count_tokens(
+                model=model, system=self._classify_system_prompt(), tools=CLASSIFY_TOOLS, messages=probe
+            )
+            without_prefix = self.client.messages.count_tokens(model=model, messages=probe)
+        except Exception as e:
+            print(f"Error counting prompt tokens: {e}", flush=True)
+            return None
+
+        self.prefix_tokens = with_prefix.input_tokens - without_prefix.input_tokens
+        uncached = []
+        for candidate in dict.fromkeys([model, self.router.model_for('classify', escalate=True)]):
+            minimum = self.router.min_cacheable_tokens(candidate)
+            if self.prefix_tokens < minimum:
+                uncached.append(f"{candidate} (needs {minimum})")
+        if uncached:
+            self.cache_note = f"prefix of {self.prefix_tokens} tokens not cached on " + ", ".join(uncached)
+            print(f"Warning: classification {self.cache_note}", flush=True)
+        else:
+            self.cache_note = None
+            print(f"Classification prefix is {self.prefix_tokens} tokens (cacheable)", flush=True)
+        return self.prefix_tokens
+
+    def log_stats(self, force: bool = False) -> None:
+        """Print the prompt cache, model tier and scheduler summaries, at most every stats_interval seconds."""
+        now = time.monotonic()
+        with self._stats_lock:
+            if not force and now - self._stats_logged_at < self.stats_interval:
+                return
+            self._stats_logged_at = now
+        note = f" ({self.cache_note})" if self.cache_note else ""
+        print(self.cache_stats.summary() + note, flush=True)
+        print(self.router.summary(), flush=True)
+        print(self.scheduler.summary(), flush=True)
+        print(self.response_cache.summary(), flush=True)
+
+    def _classify_system_prompt(self) -> list[dict]:
+        """System prefix for llm_check(); see _classify_prompt()."""
+        return self._classify_prompt()[0]
+
+    def _classify_prompt(self) -> tuple[list[dict], str]:
+        """
+        System prefix for llm_check(): the instructions plus learned examples, and its
+        cache key version, read together so a newly learned example can't split them.
+        The cache breakpoint sits on the last block, so the whole prefix is reused
+        across calls until a new example is learned.
+        """
+        with self._prompt_lock:
+            if self._system_prompt is None:
+                blocks = [{"type": "text", "text": CLASSIFY_INSTRUCTIONS}]
+                if self.scheduling_examples:
+                    learned = "\n".join(f'- "{example}"' for example in self.scheduling_examples)
+                    blocks.append({
+                        "type": "text",
+                        "text": f"Messages like these were missed before and ARE scheduling messages:\n{learned}"
+                    })
+                blocks[-1]["cache_control"] = {"type": "ephemeral"}
+                self._system_prompt = blocks
+                prompt_hash = hashlib.sha256(json.dumps(blocks).encode('utf-8')).hexdigest()[:12]
+                self._classify_version = f"{PROMPT_VERSION}:{prompt_hash}"
+            return self._system_prompt, self._classify_version
+
+    def llm_check(self, content: str, guild_id=None, channel_id=None) -> dict | None:
+        """
+        Use Claude to determine if this is an event scheduling message
+        and extract the event details if it is. Only this channel's recent
+        history is sent as context.
+
+        Returns:
+            dict with keys: name, location, description, datetime_hint, is_event
+            None if LLM decides it's not an event scheduling message
+        """
+        try:
+            scope = (guild_id, channel_id)
+            system, prompt_version = self._classify_prompt()
+
+            history = self.conversations.messages(scope)
+            version = self._classify_cache_version(prompt_version, history)
+
+            cached = self.response_cache.get('classify', content, version)
+            if cached is not None:
+                result = dict(cached)
+                print("Classification cache hit", flush=True)
+                self.conversations.record(scope, f'Message: "{content}"', json.dumps(result))
+            else:
+                result = self._classify_with_llm(content, scope, system, history)
+                if result is None:
+                    return None
+                self.response_cache.set('classify', content, result, version)
 
             print(f"LLM Response: {result}", flush=True)
             sys.stdout.flush()
@@ -94,13 +293,87 @@ Only return valid JSON, no other text."""
 
             print(f"Not an event or low confidence", flush=True)
             return None
+        except LoadShed as e:
+            print(f"Skipping classification: {e}", flush=True)
+            return None
         except Exception as e:
             print(f"Error in LLM check: {e}", flush=True)
             import traceback
             traceback.print_exc()
             return None
 
-    def parse_event_message(self, content: str) -> dict | None:
+    @staticmethod
+    def _classify_cache_version(prompt_version: str, history: list[dict]) -> str:
+        """
+        Cache key version for classifying a message after `history`: the prompt version,
+        plus only whether the channel had recent history at all. The history itself
+        changes with every message, so keying on it would make every repeat a miss;
+        the coarse signal keeps a bare follow-up ("tmrw?") seen mid-conversation apart
+        from the same text with nothing before it.
+        """
+        return f"{prompt_version}:{'context' if history else 'fresh'}"
+
+    def _classify_with_llm(self, content: str, scope: tuple, system: list[dict], history: list[dict]) -> dict | None:
+        """
+        Ask Claude to classify one message, after the channel's `history`.
+        Returns the parsed JSON, or None if it was malformed.
+        """
+        messages = list(history)
+        if messages:
+            # Second breakpoint: the channel history is also a stable prefix between messages
+            last = messages[-1]
+            messages[-1] = {
+                "role": last["role"],
+                "content": [{"type": "text", "text": last["content"], "cache_control": {"type": "ephemeral"}}]
+            }
+        messages.append({"role": "user", "content": f'Message: "{content}"'})
+
+        result, raw_text = self._classify_call(messages, system)
+        if result is not None and self._is_unsure(result):
+            print("Unsure classification, escalating to the large model", flush=True)
+            result, raw_text = self._classify_call(messages, system, escalate=True)
+
+        # Remember the exchange - the instructions live in the system prefix
+        self.conversations.record(scope, f'Message: "{content}"', raw_text)
+        return result
+
+    def _classify_call(self, messages: list[dict], system: list[dict], escalate: bool = False) -> tuple[dict | None, str]:
+        """
+        One classification request, answered through CLASSIFY_TOOL. Invalid fields get
+        a single repair request (see structured_output.tool_call).
+        Returns (validated result or None, the answer as JSON text for the channel history).
+        """
+        result, errors, response = tool_call(
+            self.router,
+            'classify',
+            CLASSIFY_TOOL,
+            messages,
+            escalate=escalate,
+            tools=CLASSIFY_TOOLS,
+            max_tokens=500,
+            system=system
+        )
+        self.cache_stats.record(getattr(response, 'usage', None))
+        self.log_stats()
+
+        raw_text = json.dumps(result)
+        print(f"Claude classification: {raw_text}", flush=True)
+
+        required = CLASSIFY_TOOL["input_schema"]["required"]
+        if any(field in errors for field in required + ["*"]):
+            print(f"Classification still invalid after repair: {errors}", flush=True)
+            return None, raw_text
+        return result, raw_text
+
+    def _is_unsure(self, result: dict) -> bool:
+        """True if a classification's confidence is too close to the cut-off to trust the small model."""
+        confidence = result.get('confidence')
+        if not isinstance(confidence, (int, float)):
+            return True
+        low, high = self.escalate_confidence
+        return low <= confidence <= high
+
+    def parse_event_message(self, content: str, guild_id=None, channel_id=None) -> dict | None:
         """
         Parse a message for event scheduling using LLM only.
 
@@ -108,9 +381,142 @@ Only return valid JSON, no other text."""
             dict with event details, or None if not an event scheduling message
         """
         # Use LLM to determine if this is an event scheduling message
-        result = self.llm_check(content)
+        with metrics.span('classify'):
+            result = self.llm_check(content, guild_id=guild_id, channel_id=channel_id)
 
         if result:
+            self._complete_event(result, content)
+
+        return result
+
+    def classify_batch(self, contents: list[str], authors: list[str] | None = None,
+                       guild_id=None, channel_id=None) -> list[dict]:
+        """
+        Classify a burst of messages from one channel in a single LLM call, so plans
+        spread over several short messages ("coffee?", "tmrw", "3pm") are seen together.
+
+        Returns:
+            list of event dicts (as from parse_event_message), each with a
+            "message_index" pointing at the message in `contents` it came from
+        """
+        if len(contents) == 1:
+            result = self.parse_event_message(contents[0], guild_id=guild_id, channel_id=channel_id)
+            if not result:
+                return []
+            result['message_index'] = 0
+            return [result]
+
+        try:
+            scope = (guild_id, channel_id)
+            authors = authors or ["someone"] * len(contents)
+            system, prompt_version = self._classify_prompt()
+            version = self._classify_cache_version(prompt_version, self.conversations.messages(scope))
+
+            # Messages classified before are answered from the cache; only the rest go to the model
+            detections, misses = [], []
+            for i, content in enumerate(contents):
+                cached = self.response_cache.get('classify', content, version)
+                if cached is None:
+                    misses.append(i)
+                    continue
+                detections.append(dict(cached, message_index=i))
+                # Kept in the history like llm_check() does, as context for the misses
+                self.conversations.record(scope, f'Message: "{content}"', json.dumps(cached))
+
+            if misses:
+                detections += self._classify_batch_misses(
+                    [contents[i] for i in misses], [authors[i] for i in misses], misses, scope, system, version
+                )
+
+            events = []
+            for result in sorted(detections, key=lambda d: d['message_index']):
+                if not (result.get('is_event') and result.get('confidence', 0) > 0.5):
+                    continue
+                index = result['message_index']
+                self._complete_event(result, contents[index])
+                print(f"Event detected in batch: {result.get('name')} (message {index})", flush=True)
+                events.append(result)
+
+            return events
+        except LoadShed as e:
+            print(f"Skipping batch classification: {e}", flush=True)
+            return []
+        except Exception as e:
+            print(f"Error in batch classification: {e}", flush=True)
+            return []
+
+    def _classify_batch_misses(self, contents: list[str], authors: list[str], indexes: list[int],
+                               scope: tuple, system: list[dict], version: str) -> list[dict]:
+        """
+        Classify the uncached messages of a batch in one call, and cache each message's
+        answer under `version`. `indexes` are the messages' positions in the whole batch.
+        Returns the detections, with message_index pointing into the whole batch.
+        """
+        numbered = "\n".join(
+            f'[{i}] {author}: "{content}"' for i, (author, content) in enumerate(zip(authors, contents))
+        )
+        batch_prompt = f"""Messages (numbered, oldest first, all from this channel):
+{numbered}
+
+These messages may together describe one plan, several plans, or none. Call record_classifications with one entry per distinct event being planned, each with "message_index" set to the number of the message that proposes it. Combine details spread across messages into one event. Record an empty list if none of the messages plan an event."""
+
+        messages = self.conversations.messages(scope)
+        messages.append({"role": "user", "content": batch_prompt})
+
+        with metrics.span('classify'):
+            detections, errors, raw_text = self._classify_batch_call(messages, system)
+
+        self.conversations.record(scope, f"Messages:\n{numbered}", raw_text)
+        if detections is None:
+            return []
+
+        answers = {}
+        for result in detections:
+            index = result.get('message_index')
+            if not isinstance(index, int) or not 0 <= index < len(contents):
+                index = len(contents) - 1
+            result['message_index'] = indexes[index]
+            answers.setdefault(index, result)
+
+        if errors:
+            # Dropped detections would be cached as "not an event" below
+            return detections
+
+        # Messages the model folded into another one's event, or found nothing in, are not events alone
+        for i, content in enumerate(contents):
+            answer = {k: v for k, v in answers.get(i, NOT_AN_EVENT).items() if k != 'message_index'}
+            self.response_cache.set('classify', content, answer, version)
+        return detections
+
+    def _classify_batch_call(self, messages: list[dict], system: list[dict]) -> tuple[list | None, dict, str]:
+        """
+        One batch classification request, answered through CLASSIFY_BATCH_TOOL. Invalid
+        entries get the same single repair request as single messages (see
+        structured_output.tool_call); entries still invalid after it are dropped.
+        Returns (valid detections, or None if the answer had no usable list;
+        the remaining errors; the answer as JSON text for the channel history).
+        """
+        result, errors, response = tool_call(
+            self.router,
+            'classify_batch',
+            CLASSIFY_BATCH_TOOL,
+            messages,
+            tools=CLASSIFY_TOOLS,
+            max_tokens=800,
+            system=system
+        )
+        self.cache_stats.record(getattr(response, 'usage', None))
+        self.log_stats()
+
+        raw_text = json.dumps(result)
+        print(f"Claude batch classification: {raw_text}", flush=True)
+        if errors:
+            print(f"Dropping invalid batch detections after repair: {errors}", flush=True)
+        return result.get('events'), errors, raw_text
+
+    def _complete_event(self, result: dict, content: str) -> None:
+        """Fill in the name and ISO event_date of a detected event, in place."""
+        with metrics.span('complete_event'):
             # Ensure name is always set for valid events
             if not result.get('name'):
                 result['name'] = self._generate_event_name(content)
@@ -126,15 +532,17 @@ Only return valid JSON, no other text."""
             else:
                 result['event_date'] = None
 
-        return result
-
     def _generate_event_name(self, content: str) -> str:
         """
         Generate a descriptive event name from the message content using Claude.
         """
+        cached = self.response_cache.get('name', content, PROMPT_VERSION)
+        if cached is not None:
+            return cached
+
         try:
-            response = self.client.messages.create(
-                model="claude-opus-4-1-20250805",
+            response = self.router.create(
+                'name',
                 max_tokens=50,
                 messages=[
                     {
@@ -153,7 +561,10 @@ Respond with ONLY the event name, nothing else."""
 
             name = response.content[0].text.strip()
             print(f"Generated event name: {name}", flush=True)
-            return name if name else "Social Event"
+            if not name:
+                return "Social Event"
+            self.response_cache.set('name', content, name, PROMPT_VERSION)
+            return name
         except Exception as e:
             print(f"Error generating event name: {e}", flush=True)
             return "Social Event"
@@ -162,109 +573,87 @@ Respond with ONLY the event name, nothing else."""
         """
         Convert a natural language datetime hint to ISO format using Claude.
         Falls back to simple heuristics if LLM fails.
+        Results are cached per reference date, since "tomorrow" means something else each day.
         """
-        try:
-            response = self.client.messages.create(
-                model="claude-opus-4-1-20250805",
-                max_tokens=100,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": f"""Convert this date/time mention to ISO 8601 format (YYYY-MM-DDTHH:MM:SS).
-Today's date is {datetime.now().strftime('%Y-%m-%d')}.
+        today = datetime.now().strftime('%Y-%m-%d')
+        version = f"{PROMPT_VERSION}:{today}"
+        cached = self.response_cache.get('datetime', datetime_hint, version)
+        if cached is not None:
+            return cached if cached != "INVALID" else None
+
+        prompt = f"""Convert this date/time mention to ISO 8601 format (YYYY-MM-DDTHH:MM:SS).
+Today's date is {today}.
 
 Date/time mention: "{datetime_hint}"
 
 Respond with ONLY the ISO datetime, nothing else. If you cannot determine a valid datetime, respond with "INVALID"."""
-                    }
-                ]
-            )
 
-            iso_str = response.content[0].text.strip()
-
-            if iso_str == "INVALID" or not iso_str:
-                return None
+        try:
+            for escalate in (False, True):
+                response = self.router.create(
+                    'datetime',
+                    escalate=escalate,
+                    max_tokens=100,
+                    messages=[{"role": "user", "content": prompt}]
+                )
+
+                iso_str = response.content[0].text.strip()
+
+                if iso_str == "INVALID" or not iso_str:
+                    self.response_cache.set('datetime', datetime_hint, "INVALID", version)
+                    return None
+
+                # Validate it's actually ISO format; if not, give the large model a go
+                try:
+                    datetime.fromisoformat(iso_str)
+                except ValueError:
+                    print(f"Invalid ISO datetime '{iso_str}'", flush=True)
+                    continue
+
+                self.response_cache.set('datetime', datetime_hint, iso_str, version)
+                return iso_str
 
-            # Validate it's actually ISO format
-            datetime.fromisoformat(iso_str)
-            return iso_str
+            return None
         except Exception as e:
             print(f"Error converting datetime: {e}")
             return None
 
-    def check_event_similarity(self, new_event: dict) -> bool:
+    def check_event_similarity(self, new_event: dict, guild_id=None, channel_id=None) -> bool:
         """
-        Check if the new event is semantically similar to any recently scheduled events.
-        Uses Claude's conversation history as the source of truth for recently scheduled events.
+        Check if the new event duplicates a recently scheduled event in the same guild/channel.
+        Uses the local event index (name tokens, location and time window) - no LLM call.
         Returns True if a duplicate is found, False otherwise.
         """
         try:
-            # Add question to conversation history
-            self.conversation_history.append({
-                "role": "user",
-                "content": f"""I'm about to schedule a new event. Based on our conversation history and events we've already scheduled,
-is this new event a duplicate or the same event as something we already scheduled?
-
-New event details:
-- Name: {new_event.get('name', 'Unknown')}
-- Location: {new_event.get('location', 'TBD')}
-- When: {new_event.get('datetime_hint', 'TBD')}
-- Description: {new_event.get('description', 'None')}
-
-Look through our recent conversation and event scheduling history. Is this the same event we already scheduled,
-or is it a different event?
-
-Respond with only "YES" if it's a duplicate (same event), "NO" if it's different."""
-            })
-
-            response = self.client.messages.create(
-                model="claude-opus-4-1-20250805",
-                max_tokens=100,
-                messages=self.conversation_history
-            )
-
-            response_text = response.content[0].text.strip().upper()
-
-            # Add Claude's response to history for continuity
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": response_text
-            })
-
-            # Keep conversation history manageable (last 20 exchanges)
-            if len(self.conversation_history) > 40:
-                self.conversation_history = self.conversation_history[-40:]
+            match = self.event_index.find_duplicate(new_event, guild_id=guild_id, channel_id=channel_id)
 
-            print(f"Similarity check response: {response_text}", flush=True)
+            if match:
+                print(f"Duplicate of recently scheduled event: {match.name}", flush=True)
+                return True
 
-            return "YES" in response_text
+            return False
 
         except Exception as e:
             print(f"Error checking event similarity: {e}", flush=True)
             return False
 
-    def add_to_agent_context(self, event_details: dict) -> None:
+    def add_to_agent_context(self, event_details: dict, guild_id=None, channel_id=None, social_id=None) -> None:
         """
-        Add a scheduled event to Claude's conversation history as context.
-        This becomes part of the agent's memory for deduplication.
+        Add a scheduled event to this channel's conversation history as context,
+        and to the local event index used for deduplication.
         """
         try:
+            self.event_index.add(event_details, guild_id=guild_id, channel_id=channel_id, social_id=social_id)
+
             event_summary = f"""Event scheduled:
 - Name: {event_details.get('name', 'Unknown')}
 - Location: {event_details.get('location', 'TBD')}
 - When: {event_details.get('datetime_hint', 'TBD')}
 - Description: {event_details.get('description', 'None')}
 
-This event has been scheduled and saved. Remember this for future duplicate detection."""
-
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": event_summary
-            })
+This event has been scheduled and saved."""
 
-            # Keep conversation history manageable
-            if len(self.conversation_history) > 40:
-                self.conversation_history = self.conversation_history[-40:]
+            self.conversations.record((guild_id, channel_id), event_summary, "Noted.")
 
             print(f"Added to agent context: {event_details.get('name')}", flush=True)
 
@@ -279,38 +668,23 @@ This event has been scheduled and saved. Remember this for future duplicate dete
         try:
             missing_str = ", ".join(missing_fields)
 
-            response = self.client.messages.create(
-                model="claude-opus-4-1-20250805",
-                max_tokens=300,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": f"""Extract the missing event information from this message.
+            prompt = f"""Extract the missing event information from this message.
 The missing fields are: {missing_str}
 
 Message: "{message_content}"
 
-Respond with a JSON object containing only the fields that are mentioned:
-- "name": string (event name/title if mentioned, or null)
-- "datetime_hint": string (date/time if mentioned, or null)
-- "location": string (location if mentioned, or null)
-- "description": string (additional details if mentioned, or null)
-
-Only include fields that are actually present in the message. Return null for missing fields.
-Only return valid JSON, no other text."""
-                    }
-                ]
-            )
-
-            response_text = response.content[0].text.strip()
-
-            # Strip markdown code blocks if present
-            if response_text.startswith("```"):
-                response_text = response_text.split('\n', 1)[1] if '\n' in response_text else response_text
-                if response_text.endswith("```"):
-                    response_text = response_text[:-3].rstrip()
+Call record_event_details with the fields that are actually present in the message, and null for the rest."""
 
-            result = json.loads(response_text)
+            with metrics.span('extract'):
+                result, errors, _ = tool_call(
+                    self.router,
+                    'extract',
+                    EXTRACT_TOOL,
+                    [{"role": "user", "content": prompt}],
+                    max_tokens=300
+                )
+            if errors:
+                print(f"Dropping invalid thread fields after repair: {errors}", flush=True)
 
             # Filter out None values
             filtered_result = {k: v for k, v in result.items() if v is not None}
@@ -325,32 +699,16 @@ Only return valid JSON, no other text."""
     def learn_scheduling_pattern(self, message_content: str) -> None:
         """
         Learn from a scheduling message that was previously missed.
-        This adds it to the conversation history so Claude can reference it.
+        The example is added to the cached system prefix used by llm_check().
         """
-        # Add this message to conversation history as a positive example
-        learning_prompt = f"""This message should be recognized as a scheduling/event planning message:
-"{message_content}"
-
-Remember this pattern and recognize similar messages as event scheduling in the future."""
-
-        self.conversation_history.append({
-            "role": "user",
-            "content": learning_prompt
-        })
+        with self._prompt_lock:
+            if message_content in self.scheduling_examples:
+                return
 
-        # Add a confirmation to history
-        self.conversation_history.append({
-            "role": "assistant",
-            "content": f"Understood. I've learned that '{message_content[:60]}...' is a scheduling pattern and will recognize similar messages in the future."
-        })
-
-        # Store example for reference
-        self.scheduling_examples.append(message_content)
-
-        # Keep conversation history manageable (last 20 exchanges)
-        if len(self.conversation_history) > 40:
-            self.conversation_history = self.conversation_history[-40:]
+            # Store example for reference, oldest examples drop off first
+            self.scheduling_examples.append(message_content)
+            self.scheduling_examples = self.scheduling_examples[-MAX_LEARNED_EXAMPLES:]
+            self._system_prompt = None
 
         print(f"Learned scheduling pattern: {message_content[:50]}...", flush=True)
         print(f"Total scheduling examples learned: {len(self.scheduling_examples)}", flush=True)
-
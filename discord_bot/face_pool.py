@@ -0,0 +1,94 @@
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Each worker (process or thread) keeps its own detector here
+_worker = threading.local()
+
+
+def _init_worker(max_side: int) -> None:
+    from image_detection import imageDetection
+    _worker.detector = imageDetection(max_side=max_side)
+
+
+def _count_faces(image) -> int:
+    return _worker.detector.count_faces(image)
+
+
+def _perceptual_hash(image) -> int | None:
+    from image_detection import perceptual_hash
+    return perceptual_hash(image)
+
+
+def _warm_up(_) -> None:
+    _ = _worker.detector.detector  # loads mediapipe and the model
+
+
+class FaceDetectionPool:
+    """
+    Runs face detection off the event loop, on a pool with one detector per worker.
+
+    At most `workers + queue_size` images are in flight; further callers wait for a
+    slot. Callers that download images should bound the downloads the same way (the
+    bot holds a semaphore of the same size from before the download), otherwise the
+    waiting images still pile up in memory in front of the pool.
+    `kind` is "process" (default, sidesteps the GIL) or "thread".
+    """
+
+    def __init__(self, workers: int = 2, queue_size: int = 16, kind: str = "process", max_side: int = 640):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.kind = kind
+        self.max_side = max_side
+        self.in_flight = 0
+        self._executor = None
+        self._slots = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.kind == "thread":
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="face-detect",
+                    initializer=_init_worker,
+                    initargs=(self.max_side,)
+                )
+            else:
+                # spawn, not fork: forking a process that runs the gateway's threads isn't safe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.max_side,)
+                )
+        return self._executor
+
+    async def count_faces(self, image) -> int:
+        """Count faces in one image (bytes or RGB array) without blocking the event loop."""
+        return await self._run(_count_faces, image)
+
+    async def perceptual_hash(self, image) -> int | None:
+        """Compute an image's dHash on the pool (decoding is CPU work too)."""
+        return await self._run(_perceptual_hash, image)
+
+    async def warm_up(self) -> None:
+        """Start the workers and load their models ahead of the first photo."""
+        await asyncio.gather(*(self._run(_warm_up, None) for _ in range(self.workers)))
+
+    async def _run(self, func, image):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers + self.queue_size)
+
+        async with self._slots:
+            self.in_flight += 1
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._get_executor(), func, image)
+            finally:
+                self.in_flight -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
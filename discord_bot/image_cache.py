@@ -0,0 +1,142 @@
+import time
+import sqlite3
+from collections import OrderedDict, defaultdict
+
+# dHash is 64 bits; split into 8 bands of 8 bits. Two hashes within 7 bits of each
+# other must agree on at least one whole band, so bands work as an exact candidate filter.
+BANDS = 8
+BAND_BITS = 64 // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+
+def _bands(phash: int) -> list[tuple[int, int]]:
+    return [(i, (phash >> (i * BAND_BITS)) & BAND_MASK) for i in range(BANDS)]
+
+
+class FaceCountCache:
+    """
+    Size-bounded LRU of face counts for images the bot has already seen.
+
+    Entries are keyed by content hash (sha256 of the bytes), and can also be found by
+    Discord attachment (id, size) - which lets the bot skip the download - or by a
+    perceptual hash within `max_distance` bits, which catches re-encoded reposts.
+    With a path, entries are also kept in SQLite so the cache survives restarts.
+    """
+
+    def __init__(self, max_entries: int = 5000, max_distance: int = 6, path: str | None = None):
+        self.max_entries = max_entries
+        self.max_distance = min(max_distance, BANDS - 1)
+        self.entries = OrderedDict()  # {content_hash: (face_count, phash, attachment_key)}, least recently used first
+        self.by_attachment = {}  # {(attachment_id, size): content_hash}
+        self.by_band = defaultdict(set)  # {(band, value): {content_hash, ...}}
+        self.hits = {"attachment": 0, "content": 0, "perceptual": 0}
+        self._db = None
+
+        if path:
+            self._db = sqlite3.connect(path)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS image_cache (
+                    content_hash TEXT PRIMARY KEY,
+                    face_count INTEGER NOT NULL,
+                    phash TEXT,
+                    attachment_key TEXT,
+                    written_at REAL NOT NULL
+                )
+            """)
+            self._load()
+
+    def get_by_attachment(self, attachment_id: int, size: int) -> int | None:
+        content_hash = self.by_attachment.get((attachment_id, size))
+        return self._hit(content_hash, "attachment")
+
+    def get_by_content(self, content_hash: str) -> int | None:
+        return self._hit(content_hash, "content")
+
+    def get_similar(self, phash: int | None) -> int | None:
+        """Face count of a cached image whose perceptual hash is within max_distance bits."""
+        if phash is None:
+            return None
+
+        best, best_distance = None, self.max_distance + 1
+        seen = set()
+        for band in _bands(phash):
+            for content_hash in self.by_band.get(band, ()):
+                if content_hash in seen:
+                    continue
+                seen.add(content_hash)
+                distance = (self.entries[content_hash][1] ^ phash).bit_count()
+                if distance < best_distance:
+                    best, best_distance = content_hash, distance
+
+        return self._hit(best, "perceptual")
+
+    def put(self, content_hash: str, face_count: int, phash: int | None = None,
+            attachment_id: int | None = None, size: int | None = None) -> None:
+        attachment_key = (attachment_id, size) if attachment_id is not None else None
+        self._insert(content_hash, face_count, phash, attachment_key)
+
+        if self._db is not None:
+            _, phash, attachment_key = self.entries[content_hash]
+            self._db.execute(
+                "INSERT OR REPLACE INTO image_cache (content_hash, face_count, phash, attachment_key, written_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (content_hash, face_count,
+                 f"{phash:016x}" if phash is not None else None,
+                 f"{attachment_key[0]}:{attachment_key[1]}" if attachment_key else None,
+                 time.time())
+            )
+            self._db.commit()
+
+    def _hit(self, content_hash: str | None, kind: str) -> int | None:
+        entry = self.entries.get(content_hash) if content_hash else None
+        if entry is None:
+            return None
+        self.entries.move_to_end(content_hash)
+        self.hits[kind] += 1
+        return entry[0]
+
+    def _insert(self, content_hash, face_count, phash, attachment_key) -> None:
+        if content_hash in self.entries:
+            # Keep what we already know about this image if the caller didn't compute it again
+            _, old_phash, old_attachment_key = self.entries[content_hash]
+            phash = phash if phash is not None else old_phash
+            attachment_key = attachment_key or old_attachment_key
+            self._remove(content_hash)
+
+        self.entries[content_hash] = (face_count, phash, attachment_key)
+        if attachment_key is not None:
+            self.by_attachment[attachment_key] = content_hash
+        if phash is not None:
+            for band in _bands(phash):
+                self.by_band[band].add(content_hash)
+
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)), from_disk=True)
+
+    def _remove(self, content_hash: str, from_disk: bool = False) -> None:
+        face_count, phash, attachment_key = self.entries.pop(content_hash)
+        if attachment_key is not None and self.by_attachment.get(attachment_key) == content_hash:
+            del self.by_attachment[attachment_key]
+        if phash is not None:
+            for band in _bands(phash):
+                hashes = self.by_band.get(band)
+                if hashes is not None:
+                    hashes.discard(content_hash)
+                    if not hashes:
+                        del self.by_band[band]
+        if from_disk and self._db is not None:
+            self._db.execute("DELETE FROM image_cache WHERE content_hash = ?", (content_hash,))
+
+    def _load(self) -> None:
+        rows = self._db.execute(
+            "SELECT content_hash, face_count, phash, attachment_key FROM image_cache "
+            "ORDER BY written_at DESC LIMIT ?", (self.max_entries,)
+        ).fetchall()
+
+        # Insert oldest first so the LRU order matches the order they were written
+        for content_hash, face_count, phash, attachment_key in reversed(rows):
+            if attachment_key:
+                attachment_id, size = attachment_key.split(":")
+                attachment_key = (int(attachment_id), int(size))
+            self._insert(content_hash, face_count, int(phash, 16) if phash else None, attachment_key)
+        print(f"Loaded {len(rows)} cached face counts", flush=True)
@@ -2,37 +2,142 @@ import mediapipe as mp
 from mediapipe.tasks import python
 from mediapipe.tasks.python import vision
 import cv2
+import numpy as np
 from pathlib import Path
 
 MODEL_PATH = Path(__file__).parent / "imageModel" / "blaze_face_short_range.tflite"
 
+# The short-range model runs at 128x128, so decoding a 4000px photo at full size is wasted work.
+# Images are shrunk so their longest side is at most this many pixels (0 disables).
+DEFAULT_MAX_SIDE = 640
+
+# Scratch buffers are kept per shape; drop them all if a batch has too many distinct shapes
+MAX_BUFFER_SHAPES = 16
+
 class imageDetection:
-    def __init__(self):
-        pass
-
-    @staticmethod
-    def count_faces(image_path):
-        """
-        Takes an image path and returns the number of faces detected as an integer.
-        """
-
-        model_path = str(MODEL_PATH)
-        # 2. Configure the Face Detector
-        base_options = python.BaseOptions(model_asset_path=model_path)
-        options = vision.FaceDetectorOptions(base_options=base_options)
-        
-        # 3. Create the detector
-        with vision.FaceDetector.create_from_options(options) as detector:
-            
-            # 4. Load the image using MediaPipe's image format
-            try:
-                mp_image = mp.Image.create_from_file(image_path)
-            except Exception as e:
-                print(f"Error loading image: {e}")
-                return 0
-
-            # 5. Detect faces
-            detection_result = detector.detect(mp_image)
-            
-            # 6. Return the integer count
-            return len(detection_result.detections) #fuck vsc
+    def __init__(self, max_side: int = DEFAULT_MAX_SIDE):
+        self.max_side = max_side
+        self._detector = None
+        self._buffers = {}  # {(name, shape): preallocated uint8 array}
+
+    @property
+    def detector(self):
+        """The FaceDetector, created on first use and reused for every image."""
+        if self._detector is None:
+            base_options = python.BaseOptions(model_asset_path=str(MODEL_PATH))
+            options = vision.FaceDetectorOptions(base_options=base_options)
+            self._detector = vision.FaceDetector.create_from_options(options)
+        return self._detector
+
+    def close(self):
+        if self._detector is not None:
+            self._detector.close()
+            self._detector = None
+
+    def _buffer(self, name: str, shape: tuple) -> np.ndarray:
+        key = (name, shape)
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            if len(self._buffers) >= MAX_BUFFER_SHAPES:
+                self._buffers.clear()
+            buffer = self._buffers[key] = np.empty(shape, dtype=np.uint8)
+        return buffer
+
+    def _prepare(self, image) -> tuple[mp.Image | None, float]:
+        """
+        Decode an image into MediaPipe's format, shrinking it to max_side if needed.
+        Returns the image and the scale applied (to map boxes back to the original).
+        Resizing and colour conversion write into reused buffers; mp.Image copies the
+        pixels, so the buffers are free again as soon as this returns.
+        """
+        if isinstance(image, np.ndarray):
+            pixels, is_bgr = image, False
+        else:
+            if isinstance(image, (bytes, bytearray, memoryview)):
+                pixels = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+            else:
+                pixels = cv2.imread(str(image), cv2.IMREAD_COLOR)
+            if pixels is None:
+                return None, 1.0
+            is_bgr = True
+
+        height, width = pixels.shape[:2]
+        longest = max(height, width)
+        scale = 1.0
+        if self.max_side and longest > self.max_side:
+            # Shrink before converting colour, so the conversion runs on the small image
+            scale = self.max_side / longest
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            pixels = cv2.resize(pixels, size, dst=self._buffer("resized", (size[1], size[0], 3)),
+                                interpolation=cv2.INTER_AREA)
+
+        if is_bgr:
+            pixels = cv2.cvtColor(pixels, cv2.COLOR_BGR2RGB, dst=self._buffer("rgb", pixels.shape))
+
+        return mp.Image(image_format=mp.ImageFormat.SRGB, data=np.ascontiguousarray(pixels)), scale
+
+    def load_image(self, image) -> mp.Image | None:
+        """
+        Decode an image into MediaPipe's format, shrinking it to max_side if needed.
+        Accepts raw file bytes, a path, or an already-decoded RGB numpy array.
+        """
+        return self._prepare(image)[0]
+
+    def detect(self, image) -> dict:
+        """
+        Detect faces in one image (bytes, path or RGB array).
+        Returns {"count": int, "boxes": [(x, y, width, height), ...], "scores": [float, ...]},
+        with boxes in the original image's pixel coordinates.
+        """
+        try:
+            mp_image, scale = self._prepare(image)
+            if mp_image is None:
+                print("Error loading image: could not decode")
+        except Exception as e:
+            print(f"Error loading image: {e}")
+            mp_image = None
+
+        if mp_image is None:
+            return {"count": 0, "boxes": [], "scores": []}
+
+        detections = self.detector.detect(mp_image).detections
+        boxes = []
+        scores = []
+        for detection in detections:
+            box = detection.bounding_box
+            boxes.append((round(box.origin_x / scale), round(box.origin_y / scale),
+                          round(box.width / scale), round(box.height / scale)))
+            scores.append(detection.categories[0].score if detection.categories else None)
+
+        return {"count": len(detections), "boxes": boxes, "scores": scores}
+
+    def detect_batch(self, images) -> list[dict]:
+        """
+        Detect faces in many images with the same detector and scratch buffers.
+        Returns one detect() result per input, in order.
+        """
+        return [self.detect(image) for image in images]
+
+    def count_faces(self, image):
+        """
+        Takes an image (bytes, path or RGB array) and returns the number of faces detected as an integer.
+        """
+        return self.detect(image)["count"]
+
+
+def perceptual_hash(image) -> int | None:
+    """
+    64-bit difference hash (dHash) of an image given as bytes or a path.
+    Re-encoded or resized copies of the same picture hash within a few bits of each other.
+    """
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        # Decoding at 1/8 scale is plenty for a 9x8 thumbnail and much faster
+        gray = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    else:
+        gray = cv2.imread(str(image), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if gray is None:
+        return None
+
+    thumb = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (thumb[:, 1:] > thumb[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
@@ -0,0 +1,112 @@
+import json
+import time
+import sqlite3
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class IncompleteEventStore:
+    """
+    Events waiting for missing details, keyed by the thread collecting them.
+
+    Entries are plain dicts of ids and fields (no discord.py objects), so they are small
+    and can be persisted. Each entry expires `ttl` seconds after it was last touched -
+    the bot uses the thread's auto_archive_duration, since an archived thread gets no
+    more replies. Beyond `max_entries` the least recently touched entry is dropped.
+    With a path, entries are mirrored to SQLite so collection survives restarts. Lookups
+    only read memory; disk writes go to a single writer thread, in order, so the event
+    loop never waits on a commit. close() waits for the queued writes.
+    """
+
+    def __init__(self, max_entries: int = 1000, path: str | None = None):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # {thread_id: (expires_at, entry)}, least recently touched first
+        self._db = None
+        self._writer = None
+
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS incomplete_events (
+                    thread_id INTEGER PRIMARY KEY,
+                    entry TEXT NOT NULL,
+                    ttl REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            self._db.execute("DELETE FROM incomplete_events WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+            for thread_id, entry, ttl, expires_at in self._db.execute(
+                "SELECT thread_id, entry, ttl, expires_at FROM incomplete_events ORDER BY expires_at"
+            ):
+                self.entries[thread_id] = (expires_at, json.loads(entry) | {'ttl': ttl})
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="incomplete-events")
+            self._evict()
+            print(f"Restored {len(self.entries)} incomplete events", flush=True)
+
+    def __contains__(self, thread_id) -> bool:
+        return self.get(thread_id) is not None
+
+    def get(self, thread_id) -> dict | None:
+        item = self.entries.get(thread_id)
+        if item is None:
+            return None
+        if item[0] < time.time():
+            self.remove(thread_id)
+            return None
+        return item[1]
+
+    def put(self, thread_id, entry: dict, ttl: float) -> None:
+        """Store (or refresh) an entry; `ttl` is kept with it so later touches reuse it."""
+        entry = dict(entry, ttl=ttl)
+        expires_at = time.time() + ttl
+        self.entries[thread_id] = (expires_at, entry)
+        self.entries.move_to_end(thread_id)
+
+        if self._writer is not None:
+            # Serialized here: the caller may keep changing the entry while the write waits
+            stored = json.dumps({k: v for k, v in entry.items() if k != 'ttl'})
+            self._write(
+                "INSERT OR REPLACE INTO incomplete_events (thread_id, entry, ttl, expires_at) VALUES (?, ?, ?, ?)",
+                (thread_id, stored, ttl, expires_at)
+            )
+
+        self._evict()
+
+    def touch(self, thread_id) -> None:
+        """Save changes to an entry and restart its expiry, e.g. on each reply in the thread."""
+        entry = self.get(thread_id)
+        if entry is not None:
+            self.put(thread_id, entry, entry['ttl'])
+
+    def remove(self, thread_id) -> None:
+        self.entries.pop(thread_id, None)
+        if self._writer is not None:
+            self._write("DELETE FROM incomplete_events WHERE thread_id = ?", (thread_id,))
+
+    def close(self) -> None:
+        """Finish the queued disk writes."""
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._writer = None
+            self._db.close()
+
+    def _write(self, sql: str, params: tuple) -> None:
+        self._writer.submit(self._execute, sql, params)
+
+    def _execute(self, sql: str, params: tuple) -> None:
+        try:
+            self._db.execute(sql, params)
+            self._db.commit()
+        except Exception as e:
+            print(f"Error saving incomplete event: {e}", flush=True)
+
+    def _evict(self) -> None:
+        now = time.time()
+        for thread_id in [t for t, (expires_at, _) in self.entries.items() if expires_at < now]:
+            self.remove(thread_id)
+        while len(self.entries) > self.max_entries:
+            self.remove(next(iter(self.entries)))
+
+    def __len__(self) -> int:
+        return len(self.entries)
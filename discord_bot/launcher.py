@@ -0,0 +1,89 @@
+"""
+Run the bot as several processes, each owning a contiguous range of shards.
+
+Reads SHARD_COUNT (required) and SHARD_PROCESSES (default: CPU count, at most one
+process per shard). If SHARD_IDS is set, only those shards are split up, so a
+large deployment can give each container its own SHARD_IDS and run this launcher
+in every container. Children are restarted with a backoff if they exit unexpectedly.
+
+Usage:
+    SHARD_COUNT=8 SHARD_PROCESSES=4 python launcher.py
+"""
+import os
+import sys
+import time
+import signal
+import subprocess
+
+from dotenv import load_dotenv
+
+from sharding import parse_shard_ids
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "discord_bot.py")
+MAX_RESTART_DELAY = 60
+
+
+def split_shards(shard_ids: list[int], processes: int) -> list[list[int]]:
+    """Split shard ids into `processes` contiguous, nearly equal groups."""
+    processes = max(1, min(processes, len(shard_ids)))
+    size, extra = divmod(len(shard_ids), processes)
+    groups, start = [], 0
+    for i in range(processes):
+        end = start + size + (1 if i < extra else 0)
+        groups.append(shard_ids[start:end])
+        start = end
+    return groups
+
+
+def spawn(shard_count: int, shard_ids: list[int]) -> subprocess.Popen:
+    env = dict(os.environ, SHARD_COUNT=str(shard_count), SHARD_IDS=",".join(map(str, shard_ids)))
+    print(f"Starting bot for shards {shard_ids[0]}-{shard_ids[-1]} of {shard_count}", flush=True)
+    return subprocess.Popen([sys.executable, BOT_SCRIPT], env=env)
+
+
+def main() -> int:
+    load_dotenv()
+    if not os.getenv('SHARD_COUNT'):
+        print("SHARD_COUNT must be set to run sharded", file=sys.stderr)
+        return 1
+
+    shard_count = int(os.getenv('SHARD_COUNT'))
+    shard_ids = parse_shard_ids(os.getenv('SHARD_IDS', '')) or list(range(shard_count))
+    processes = int(os.getenv('SHARD_PROCESSES', str(os.cpu_count() or 1)))
+    groups = split_shards(shard_ids, processes)
+
+    children = {i: spawn(shard_count, group) for i, group in enumerate(groups)}
+    started = {i: time.monotonic() for i in children}
+    delays = {i: 1 for i in children}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for child in children.values():
+            child.send_signal(signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while not stopping:
+        time.sleep(1)
+        for i, child in list(children.items()):
+            code = child.poll()
+            if code is None or stopping:
+                continue
+            if time.monotonic() - started[i] > MAX_RESTART_DELAY:
+                delays[i] = 1  # it ran fine for a while, so this isn't a crash loop
+            print(f"Shards {groups[i]} exited with code {code}, restarting in {delays[i]}s", flush=True)
+            time.sleep(delays[i])
+            delays[i] = min(delays[i] * 2, MAX_RESTART_DELAY)
+            children[i] = spawn(shard_count, groups[i])
+            started[i] = time.monotonic()
+
+    for child in children.values():
+        child.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+import time
+import heapq
+import asyncio
+import functools
+import itertools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+# Priority lanes, lowest value served first
+USER = 0  # someone is waiting on the answer: thread follow-ups, !schedule
+PASSIVE = 1  # background classification of channel messages
+
+LANE_NAMES = {USER: "user", PASSIVE: "passive"}
+
+# Lane of the LLM calls made in the current context; run_in_thread() sets it for its worker
+_priority = contextvars.ContextVar('llm_priority', default=PASSIVE)
+
+
+class LoadShed(Exception):
+    """A passive request was dropped because too many were already queued."""
+
+
+class TokenBucket:
+    """Refills continuously at `per_minute` per minute, holding at most a minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (0 if it can be taken now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)  # an oversized request only needs a full bucket
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount: float) -> None:
+        """Charge (or refund, if negative) the difference between an estimate and the real cost."""
+        self.level = min(self.capacity, self.level - amount)
+
+
+class LLMScheduler:
+    """
+    Central gate for Anthropic requests.
+
+    Requests wait for a request-per-minute and a token-per-minute bucket, and are
+    released one at a time in lane order (user-initiated before passive, FIFO within
+    a lane). Token costs are estimated up front and corrected from the response's
+    usage. A 429/529 pauses every lane for the server's retry-after before the
+    request is retried. Passive requests are shed when `max_passive_queue` are
+    already waiting.
+
+    run() blocks the calling thread while it waits. Async code hands blocking work
+    to run_in_thread(), which uses a separate thread pool per lane: passive requests
+    queued here only ever hold passive threads, so a user-initiated call always has
+    a thread of its own to reach the queue with. Passive work is also shed at
+    submission once `passive_threads + max_passive_queue` calls are outstanding.
+    """
+
+    def __init__(self, requests_per_minute: float = 50, tokens_per_minute: float = 50000,
+                 max_passive_queue: int = 8, max_attempts: int = 3,
+                 user_threads: int = 4, passive_threads: int = 4):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_passive_queue = max_passive_queue
+        self.max_attempts = max_attempts
+        self.threads = {USER: user_threads, PASSIVE: passive_threads}
+        self._executors = {
+            lane: ThreadPoolExecutor(max_workers=count, thread_name_prefix=f"llm-{LANE_NAMES[lane]}")
+            for lane, count in self.threads.items()
+        }
+        self._submitted = {lane: 0 for lane in LANE_NAMES}  # run_in_thread() calls not yet finished
+
+        self._cond = threading.Condition()
+        self._waiting = []  # heap of (lane, sequence) tickets
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+
+        self.completed = {lane: 0 for lane in LANE_NAMES}
+        self.waited = {lane: 0.0 for lane in LANE_NAMES}  # total seconds spent queued
+        self.shed = 0
+        self.rate_limited = 0
+
+    def depth(self, lane: int | None = None) -> int:
+        """Requests currently queued, in one lane or all of them."""
+        with self._cond:
+            return sum(1 for ticket in self._waiting if lane is None or ticket[0] == lane)
+
+    async def run_in_thread(self, func, *args, priority: int = PASSIVE, **kwargs):
+        """
+        Run a blocking function that makes LLM requests on the thread pool for
+        `priority`, with that lane set for every request it makes. Context variables
+        are copied in, as with asyncio.to_thread(). Must be called from the event loop.
+        Raises LoadShed if too much passive work is already outstanding.
+        """
+        if priority == PASSIVE and self._submitted[PASSIVE] >= self.threads[PASSIVE] + self.max_passive_queue:
+            with self._cond:
+                self.shed += 1
+            raise LoadShed(f"LLM queue full ({self._submitted[PASSIVE]} passive calls outstanding)")
+
+        context = contextvars.copy_context()
+        context.run(_priority.set, priority)
+        self._submitted[priority] += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executors[priority], functools.partial(context.run, func, *args, **kwargs)
+            )
+        finally:
+            self._submitted[priority] -= 1
+
+    def shutdown(self) -> None:
+        for executor in self._executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, call, estimated_tokens: int, usage_tokens=None):
+        """
+        Run `call` (a zero-argument function making one API request) once the limits
+        allow it, retrying after rate-limit responses. `usage_tokens(response)` returns
+        the real token cost, used to correct the estimate.
+        Raises LoadShed if a passive request can't be queued.
+        """
+        # Already loaded by whoever built the client, so this is just a lookup
+        from anthropic import RateLimitError, OverloadedError
+
+        lane = _priority.get()
+        for attempt in range(self.max_attempts):
+            self._acquire(lane, estimated_tokens)
+            try:
+                response = call()
+            except (RateLimitError, OverloadedError) as e:
+                delay = _retry_after(e, default=2 ** attempt)
+                with self._cond:
+                    self.rate_limited += 1
+                    self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                    self._cond.notify_all()
+                print(f"Anthropic rate limit hit, pausing {delay:.1f}s "
+                      f"(attempt {attempt + 1}/{self.max_attempts})", flush=True)
+                if attempt == self.max_attempts - 1:
+                    raise
+                continue
+
+            if usage_tokens is not None:
+                with self._cond:
+                    self.tokens.adjust(usage_tokens(response) - estimated_tokens)
+            return response
+
+    def _acquire(self, lane: int, tokens: int) -> None:
+        with self._cond:
+            if lane == PASSIVE and self.depth(PASSIVE) >= self.max_passive_queue:
+                self.shed += 1
+                raise LoadShed(f"LLM queue full ({self.max_passive_queue} passive requests waiting)")
+
+            ticket = (lane, next(self._sequence))
+            heapq.heappush(self._waiting, ticket)
+            start = time.monotonic()
+            try:
+                while True:
+                    if self._waiting[0] != ticket:
+                        self._cond.wait()
+                        continue
+
+                    now = time.monotonic()
+                    wait = max(self._paused_until - now,
+                               self.requests.wait_time(1, now),
+                               self.tokens.wait_time(tokens, now))
+                    if wait <= 0:
+                        break
+                    # Also woken early if a higher-priority request jumps the queue
+                    self._cond.wait(wait)
+
+                heapq.heappop(self._waiting)
+                self.requests.take(1)
+                self.tokens.take(tokens)
+                self.completed[lane] += 1
+                self.waited[lane] += time.monotonic() - start
+            except BaseException:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                raise
+            finally:
+                self._cond.notify_all()
+
+    def summary(self) -> str:
+        lanes = ", ".join(
+            f"{name} {self.completed[lane]} sent"
+            + (f" ({self.waited[lane] / self.completed[lane] * 1000:.0f} ms avg wait)" if self.completed[lane] else "")
+            for lane, name in LANE_NAMES.items()
+        )
+        return f"llm scheduler: {lanes}, {self.depth()} queued, {self.shed} shed, {self.rate_limited} rate limited"
+
+
+def _retry_after(error, default: float) -> float:
+    """Seconds to wait from a rate-limit response's retry-after header (delta-seconds or HTTP date)."""
+    value = error.response.headers.get('retry-after') if error.response is not None else None
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
@@ -0,0 +1,88 @@
+import time
+import asyncio
+
+
+class MessageBatcher:
+    """
+    Per-channel micro-batching of messages before classification.
+
+    Messages in a channel are collected until the channel has been quiet for
+    `quiet` seconds, `max_wait` seconds have passed since the first message
+    (the most latency batching can add), or `max_batch` messages are pending.
+    The batch is then handed to `handler(messages)` as one list.
+    """
+
+    def __init__(self, handler, quiet: float = 0.75, max_wait: float = 2.0, max_batch: int = 8):
+        self.handler = handler
+        self.quiet = quiet
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self.pending = {}  # {channel_id: [message, ...]}
+        self.first_seen = {}  # {channel_id: monotonic time of the first pending message}
+        self.last_seen = {}  # {channel_id: monotonic time of the latest pending message}
+        self.timers = {}  # {channel_id: asyncio.Task}
+        self.flushing = set()  # tasks currently inside the handler
+
+    async def submit(self, message) -> None:
+        key = message.channel.id
+        now = time.monotonic()
+
+        batch = self.pending.setdefault(key, [])
+        batch.append(message)
+        self.first_seen.setdefault(key, now)
+        self.last_seen[key] = now
+
+        if len(batch) >= self.max_batch:
+            await self.flush(key)
+        elif key not in self.timers:
+            self.timers[key] = asyncio.create_task(self._wait_and_flush(key))
+
+    async def _wait_and_flush(self, key) -> None:
+        while True:
+            deadline = min(self.first_seen[key] + self.max_wait, self.last_seen[key] + self.quiet)
+            delay = deadline - time.monotonic()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+
+        # Detach the timer first so flush() doesn't cancel the task it's running in
+        self.timers.pop(key, None)
+        await self.flush(key)
+
+    async def flush(self, key) -> None:
+        """Send a channel's pending messages to the handler now."""
+        timer = self.timers.pop(key, None)
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+
+        batch = self.pending.pop(key, None)
+        self.first_seen.pop(key, None)
+        self.last_seen.pop(key, None)
+        if not batch:
+            return
+
+        task = asyncio.current_task()
+        self.flushing.add(task)
+        try:
+            await self.handler(batch)
+        except Exception as e:
+            print(f"Error processing message batch: {e}", flush=True)
+        finally:
+            self.flushing.discard(task)
+
+    async def flush_all(self) -> None:
+        """
+        Flush every channel and wait for batches already being handled (including
+        ones flushed by their timers), e.g. on shutdown.
+        """
+        for key in list(self.pending):
+            await self.flush(key)
+
+        current = asyncio.current_task()
+        while self.flushing - {current}:
+            await asyncio.gather(*(self.flushing - {current}), return_exceptions=True)
+
+    @property
+    def depth(self) -> int:
+        """Number of messages waiting across all channels."""
+        return sum(len(batch) for batch in self.pending.values())
@@ -0,0 +1,103 @@
+import os
+import gzip
+import shutil
+import asyncio
+
+
+class MessageLogWriter:
+    """
+    Buffered, rotating log file written from a background task.
+
+    write() only appends to an in-memory list. Pending lines are written in one go
+    when `flush_size` lines are waiting or every `flush_interval` seconds, on a worker
+    thread so the event loop never blocks on file I/O. When the file passes
+    `max_bytes` it is rotated to path.1 ... path.N (gzipped if `compress`).
+    """
+
+    def __init__(self, path: str = "text_log.txt", max_bytes: int = 10 * 1024 * 1024, backups: int = 5,
+                 compress: bool = False, flush_interval: float = 2.0, flush_size: int = 200):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.compress = compress
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.pending = []
+        self._wake = None
+        self._lock = None
+        self._task = None
+
+    def start(self) -> None:
+        """Start the background flush task. Must be called from the running event loop."""
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    def write(self, line: str) -> None:
+        self.pending.append(line)
+        if len(self.pending) >= self.flush_size and self._wake is not None:
+            self._wake.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error writing message log: {e}", flush=True)
+
+    async def flush(self) -> None:
+        """Write everything pending to disk now."""
+        async with self._lock:
+            if not self.pending:
+                return
+            lines, self.pending = self.pending, []
+            await asyncio.to_thread(self._write_lines, lines)
+
+    async def close(self) -> None:
+        """Stop the background task and flush whatever is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._lock is not None:
+            await self.flush()
+        elif self.pending:
+            # Never started - write synchronously so nothing is lost
+            lines, self.pending = self.pending, []
+            self._write_lines(lines)
+
+    def _write_lines(self, lines: list[str]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(lines))
+            size = f.tell()
+        if self.max_bytes and size >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        suffix = ".gz" if self.compress else ""
+
+        # Shift path.1 -> path.2 ... dropping the oldest
+        oldest = f"{self.path}.{self.backups}{suffix}"
+        if os.path.exists(oldest):
+            os.remove(oldest)
+        for i in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{i}{suffix}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}{suffix}")
+
+        if self.backups <= 0:
+            os.remove(self.path)
+        elif self.compress:
+            with open(self.path, "rb") as src, gzip.open(f"{self.path}.1.gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self.path)
+        else:
+            os.replace(self.path, f"{self.path}.1")
@@ -0,0 +1,217 @@
+import time
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import defaultdict
+
+# Histogram buckets in seconds: stage spans run from sub-millisecond (prefilter) to tens of seconds (LLM)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13)
+TOKEN_BUCKETS = (0, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+HELP = {
+    'bot_stage_seconds': ('histogram', 'Time spent in each stage of message handling'),
+    'bot_event_loop_lag_seconds': ('histogram', 'How late the event loop woke a periodic timer'),
+    'bot_llm_request_seconds': ('histogram', 'Anthropic request latency, including rate-limit waits'),
+    'bot_llm_calls_per_message': ('histogram', 'LLM calls made while handling one message'),
+    'bot_llm_tokens_per_message': ('histogram', 'LLM tokens (input + output) spent on one message'),
+    'bot_llm_calls_total': ('counter', 'Anthropic requests by task and model tier'),
+    'bot_llm_errors_total': ('counter', 'Failed Anthropic requests by task and model tier'),
+    'bot_llm_tokens_total': ('counter', 'Anthropic tokens by task, tier and kind'),
+    'bot_messages_total': ('counter', 'Messages handled, by path'),
+    'bot_images_skipped_total': ('counter', 'Image attachments skipped because face detection was backlogged'),
+    'bot_queue_depth': ('gauge', 'Work currently queued or in flight, by queue'),
+    'bot_event_loop_lag_last_seconds': ('gauge', 'Most recent event loop lag sample'),
+}
+
+# Usage for the message currently being handled: {'calls': n, 'tokens': n}. Context
+# variables are copied into asyncio.to_thread and LLMScheduler.run_in_thread, so LLM calls
+# on worker threads see it.
+_message_usage = contextvars.ContextVar('message_usage', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class Metrics:
+    """
+    In-process metrics, rendered in the Prometheus text format.
+
+    span() times a stage, count() increments a counter, and gauges are callbacks
+    read at scrape time (queue depths). serve() exposes everything on /metrics;
+    start_lag_monitor() samples event loop lag. Safe to update from worker threads.
+    """
+
+    def __init__(self):
+        self.histograms = {}  # {(name, labels): Histogram}
+        self.counters = defaultdict(float)  # {(name, labels): value}
+        self.gauges = {}  # {(name, labels): callable}
+        self.last_lag = 0.0
+        self._lock = threading.Lock()
+        self._lag_task = None
+        self._runner = None
+
+    def observe(self, name: str, value: float, buckets: tuple = LATENCY_BUCKETS, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def count(self, name: str, value: float = 1, **labels) -> None:
+        with self._lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def gauge(self, name: str, read, **labels) -> None:
+        """Register a callback returning the gauge's current value."""
+        self.gauges[(name, tuple(sorted(labels.items())))] = read
+
+    @contextmanager
+    def span(self, stage: str):
+        """Time the enclosed block (sync or async code) as one stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('bot_stage_seconds', time.perf_counter() - start, stage=stage)
+
+    @contextmanager
+    def message_usage(self, messages: int = 1):
+        """
+        Attribute LLM calls made inside the block to `messages` messages, and record
+        the per-message calls and tokens when it ends.
+        """
+        usage = {'calls': 0, 'tokens': 0}
+        token = _message_usage.set(usage)
+        try:
+            yield usage
+        finally:
+            _message_usage.reset(token)
+            for _ in range(messages):
+                self.observe('bot_llm_calls_per_message', usage['calls'] / messages, COUNT_BUCKETS)
+                self.observe('bot_llm_tokens_per_message', usage['tokens'] / messages, TOKEN_BUCKETS)
+
+    def record_llm_call(self, task: str, tier: str, seconds: float, usage=None, error: bool = False) -> None:
+        """Called by ModelRouter for every Anthropic request."""
+        if error:
+            self.count('bot_llm_errors_total', task=task, tier=tier)
+            return
+        self.count('bot_llm_calls_total', task=task, tier=tier)
+        self.observe('bot_llm_request_seconds', seconds, task=task, tier=tier)
+
+        tokens = 0
+        if usage is not None:
+            for kind, field in (('input', 'input_tokens'), ('output', 'output_tokens'),
+                                ('cache_read', 'cache_read_input_tokens'),
+                                ('cache_write', 'cache_creation_input_tokens')):
+                value = getattr(usage, field, 0) or 0
+                tokens += value
+                if value:
+                    self.count('bot_llm_tokens_total', value, task=task, tier=tier, kind=kind)
+
+        current = _message_usage.get()
+        if current is not None:
+            current['calls'] += 1
+            current['tokens'] += tokens
+
+    def start_lag_monitor(self, interval: float = 0.5) -> None:
+        """Start sampling event loop lag. Must be called from the running event loop."""
+        if self._lag_task is None:
+            self._lag_task = asyncio.create_task(self._monitor_lag(interval))
+
+    async def _monitor_lag(self, interval: float) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            self.last_lag = max(0.0, loop.time() - expected)
+            self.observe('bot_event_loop_lag_seconds', self.last_lag, LAG_BUCKETS)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = {key: (h.buckets, list(h.counts), h.sum, h.count) for key, h in self.histograms.items()}
+            counters = dict(self.counters)
+
+        samples = defaultdict(list)  # {name: [line, ...]}
+        for (name, labels), (buckets, counts, total, count) in histograms.items():
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                samples[name].append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {cumulative}")
+            samples[name].append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+            samples[name].append(f"{name}_sum{_labels(labels)} {_number(total)}")
+            samples[name].append(f"{name}_count{_labels(labels)} {count}")
+        for (name, labels), value in counters.items():
+            samples[name].append(f"{name}{_labels(labels)} {_number(value)}")
+        for (name, labels), read in list(self.gauges.items()):
+            try:
+                samples[name].append(f"{name}{_labels(labels)} {_number(read())}")
+            except Exception as e:
+                print(f"Error reading gauge {name}: {e}", flush=True)
+        samples['bot_event_loop_lag_last_seconds'].append(f"bot_event_loop_lag_last_seconds {_number(self.last_lag)}")
+
+        lines = []
+        for name in sorted(samples):
+            kind, description = HELP.get(name, ('untyped', name))
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples[name])
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, host: str, port: int) -> None:
+        """Serve GET /metrics on host:port until stop()."""
+        from aiohttp import web  # installed with discord.py
+
+        async def handle(request):
+            return web.Response(text=self.render(),
+                                headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        print(f"Metrics on http://{host}:{port}/metrics", flush=True)
+
+    async def stop(self) -> None:
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# Shared by the bot, the parser and the model router
+metrics = Metrics()
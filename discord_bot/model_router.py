@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import threading
+
+from metrics import metrics
+
+# USD per million tokens: (input, output). Cache reads bill at 10% of input, cache writes at 125%.
+MODEL_PRICES = {
+    "claude-haiku-4-5": (1.0, 5.0),
+    "claude-sonnet-4-5": (3.0, 15.0),
+    "claude-opus-4-1-20250805": (15.0, 75.0),
+}
+
+# Shortest prompt prefix each model will cache; shorter prefixes are sent uncached without an error
+MIN_CACHEABLE_TOKENS = {
+    "claude-haiku-4-5": 4096,
+    "claude-sonnet-4-5": 1024,
+    "claude-opus-4-1-20250805": 1024,
+}
+DEFAULT_MIN_CACHEABLE_TOKENS = 1024
+
+DEFAULT_TIERS = {
+    "small": "claude-haiku-4-5",
+    "large": "claude-opus-4-1-20250805",
+}
+
+# Which tier each EventParser task starts on. Anything can still escalate to "large".
+#
+# The classification prefix (roughly 1.5k tokens with both tool definitions) is under
+# Haiku 4.5's 4096-token caching minimum, so classify and classify_batch run uncached on the
+# small tier. That is a deliberate trade: per call, ~1.5k uncached Haiku input tokens ($0.0015)
+# plus Haiku output cost about the same as Sonnet's cached read ($0.0005) plus its 3x
+# pricier uncached remainder and output, and Haiku answers faster. The prompt is kept to the
+# examples it needs rather than padded towards a minimum it can't reach. Escalations to the
+# large tier do cache. EventParser.check_prompt_cache() logs which applies at startup, and
+# bot_llm_tokens_total{kind="cache_read"} shows it per tier. LLM_ROUTE_CLASSIFY=large
+# (or a larger small-tier model) switches caching back on for the hot path.
+DEFAULT_ROUTES = {
+    "classify": "small",
+    "classify_batch": "small",
+    "name": "small",
+    "datetime": "small",
+    "extract": "small",
+}
+
+
+class TierStats:
+    """Latency, token and cost totals for one model tier."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.escalations = 0  # calls that were retries on this tier after a weaker answer
+        self.latency = 0.0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_read_tokens = 0
+        self.cache_write_tokens = 0
+        self.cost = 0.0
+
+    def record(self, model: str, latency: float, usage) -> None:
+        self.calls += 1
+        self.latency += latency
+        if usage is None:
+            return
+
+        input_tokens = getattr(usage, 'input_tokens', 0) or 0
+        output_tokens = getattr(usage, 'output_tokens', 0) or 0
+        cache_read = getattr(usage, 'cache_read_input_tokens', 0) or 0
+        cache_write = getattr(usage, 'cache_creation_input_tokens', 0) or 0
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        self.cache_read_tokens += cache_read
+        self.cache_write_tokens += cache_write
+
+        input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+        self.cost += (input_tokens * input_price + cache_read * input_price * 0.1
+                      + cache_write * input_price * 1.25 + output_tokens * output_price) / 1_000_000
+
+
+def estimate_tokens(request: dict) -> int:
+    """Rough token cost of a request before it is sent: ~4 characters per prompt token plus max_tokens."""
+    prompt = json.dumps([request.get('system'), request.get('tools'), request.get('messages')])
+    return len(prompt) // 4 + request.get('max_tokens', 0)
+
+
+def usage_tokens(response) -> int:
+    """Tokens a response counts against the per-minute limit (cache reads don't)."""
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return 0
+    return sum(getattr(usage, field, 0) or 0
+               for field in ('input_tokens', 'cache_creation_input_tokens', 'output_tokens'))
+
+
+class ModelRouter:
+    """
+    Picks a model tier per task and records per-tier metrics.
+
+    Tiers and routes can be overridden with LLM_MODEL_SMALL / LLM_MODEL_LARGE and
+    LLM_ROUTE_<TASK>=small|large (e.g. LLM_ROUTE_CLASSIFY=large). Callers pass
+    escalate=True to retry a task on the large tier after a low-confidence or
+    unparseable answer. With a scheduler, every call waits its turn there first.
+
+    `client_factory` builds the Anthropic client on the first call (or warm_up()),
+    so the SDK's imports stay off the startup path.
+    """
+
+    def __init__(self, client_factory, tiers: dict | None = None, routes: dict | None = None, scheduler=None):
+        self.client_factory = client_factory
+        self._client = None
+        self.scheduler = scheduler
+        self.tiers = dict(tiers or DEFAULT_TIERS)
+        self.routes = dict(routes or DEFAULT_ROUTES)
+
+        for tier in self.tiers:
+            model = os.getenv(f'LLM_MODEL_{tier.upper()}')
+            if model:
+                self.tiers[tier] = model
+        for task in self.routes:
+            tier = os.getenv(f'LLM_ROUTE_{task.upper()}')
+            if tier in self.tiers:
+                self.routes[task] = tier
+
+        self.stats = {tier: TierStats() for tier in self.tiers}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self.client_factory()
+        return self._client
+
+    def warm_up(self) -> None:
+        """Create the client now instead of on the first request."""
+        _ = self.client
+
+    def tier_for(self, task: str, escalate: bool = False) -> str:
+        return "large" if escalate else self.routes.get(task, "large")
+
+    def model_for(self, task: str, escalate: bool = False) -> str:
+        return self.tiers[self.tier_for(task, escalate)]
+
+    @staticmethod
+    def min_cacheable_tokens(model: str) -> int:
+        """Shortest prefix `model` will cache."""
+        return MIN_CACHEABLE_TOKENS.get(model, DEFAULT_MIN_CACHEABLE_TOKENS)
+
+    def create(self, task: str, escalate: bool = False, **kwargs):
+        """Call messages.create on the model routed for `task`. kwargs are passed through."""
+        tier = self.tier_for(task, escalate)
+        model = self.tiers[tier]
+        stats = self.stats[tier]
+
+        start = time.perf_counter()
+        try:
+            if self.scheduler is None:
+                response = self.client.messages.create(model=model, **kwargs)
+            else:
+                response = self.scheduler.run(
+                    lambda: self.client.messages.create(model=model, **kwargs),
+                    estimate_tokens(kwargs),
+                    usage_tokens
+                )
+        except Exception:
+            with self._lock:
+                stats.errors += 1
+            metrics.record_llm_call(task, tier, time.perf_counter() - start, error=True)
+            raise
+
+        latency = time.perf_counter() - start
+        metrics.record_llm_call(task, tier, latency, getattr(response, 'usage', None))
+        with self._lock:
+            stats.record(model, latency, getattr(response, 'usage', None))
+            if escalate:
+                stats.escalations += 1
+        return response
+
+    def summary(self) -> str:
+        parts = []
+        for tier, stats in self.stats.items():
+            if not stats.calls:
+                continue
+            parts.append(
+                f"{tier} ({self.tiers[tier]}): {stats.calls} calls, {stats.escalations} escalations, "
+                f"{stats.latency / stats.calls * 1000:.0f} ms avg, "
+                f"{stats.input_tokens + stats.cache_read_tokens + stats.cache_write_tokens} in / "
+                f"{stats.output_tokens} out tokens, ${stats.cost:.4f}"
+            )
+        return "model tiers: " + ("; ".join(parts) if parts else "no calls yet")
@@ -0,0 +1,436 @@
+"""
+Offline replay harness for the bot pipeline.
+
+Feeds recorded messages (text_log.txt format) through the bot's on_message logic with
+stubbed Discord objects, a local fake Anthropic API and a local fake backend, then
+reports throughput, per-stage latency and LLM calls per message.
+
+Usage:
+    python replay.py text_log.txt --llm-latency 0.4 --rate 20
+    python replay.py text_log.txt --images ./photos --image-every 10
+    python replay.py text_log.txt --backend-url http://localhost:5000   # use a real backend
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import threading
+import statistics
+import itertools
+from pathlib import Path
+from collections import defaultdict
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+LOG_LINE = re.compile(r"^\[(?P<ts>[^\]]+)\] (?P<guild>.*?) \| #(?P<channel>.*?) \| (?P<author>[^:]+): (?P<content>.*)$")
+
+# Messages the fake model treats as event planning when no canned response matches
+EVENT_WORDS = re.compile(
+    r"\b(coffee|lunch|dinner|brunch|breakfast|drinks?|pub|movie|cinema|games?|party|meet|hang ?out|"
+    r"football|gym|run|walk|trip|picnic|bbq|karaoke|bowling)\b", re.IGNORECASE
+)
+TIME_WORDS = re.compile(r"\b(today|tonight|tomorrow|tmrw|mon|tue|wed|thu|fri|sat|sun)\w*|\b\d{1,2}(:\d\d)?\s*(am|pm)\b",
+                        re.IGNORECASE)
+PLACE_WORDS = re.compile(r"\b(?:at|in) (?:the )?([a-z][\w']+(?: [a-z][\w']+)?)", re.IGNORECASE)
+
+_ids = itertools.count(1_000_000)
+
+
+# ---------------------------------------------------------------------------
+# Fake Anthropic API
+# ---------------------------------------------------------------------------
+
+def _fake_classification(content: str, canned: dict) -> dict:
+    if content in canned:
+        return canned[content]
+    if not EVENT_WORDS.search(content):
+        return {"is_event": False, "name": None, "location": None, "description": None,
+                "datetime_hint": None, "confidence": 0.1}
+    when = TIME_WORDS.search(content)
+    where = PLACE_WORDS.search(content)
+    return {
+        "is_event": True,
+        "name": f"{EVENT_WORDS.search(content).group(1).title()} Meetup",
+        "location": where.group(1) if where else None,
+        "description": content[:80],
+        "datetime_hint": when.group(0) if when else None,
+        "confidence": 0.9,
+    }
+
+
+class FakeAnthropic:
+    """Serves POST /v1/messages with canned answers after a configurable delay."""
+
+    def __init__(self, latency: float, jitter: float, canned: dict):
+        self.latency = latency
+        self.jitter = jitter
+        self.canned = canned
+        self.calls = defaultdict(int)  # {kind: count}
+        self.lock = threading.Lock()
+
+    def respond(self, body: dict) -> str:
+        last = body["messages"][-1]["content"]
+        if isinstance(last, list):
+            last = "".join(block.get("text", "") for block in last)
+
+        if last.startswith("Messages (numbered"):
+            kind = "classify_batch"
+            events = []
+            for match in re.finditer(r'^\[(\d+)\] [^:]+: "(.*)"$', last, re.MULTILINE):
+                result = _fake_classification(match.group(2), self.canned)
+                if result.get("is_event"):
+                    events.append(dict(result, message_index=int(match.group(1))))
+            text = json.dumps({"events": events})
+        elif last.startswith('Message: "'):
+            kind = "classify"
+            text = json.dumps(_fake_classification(last[len('Message: "'):-1], self.canned))
+        elif last.startswith("Generate a short"):
+            kind = "name"
+            text = "Replay Event"
+        elif last.startswith("Convert this date/time"):
+            kind = "datetime"
+            text = (datetime.now() + timedelta(days=1)).replace(hour=18, minute=0, second=0, microsecond=0).isoformat()
+        elif last.startswith("Extract the missing"):
+            kind = "extract"
+            text = json.dumps({"location": "the usual place"})
+        else:
+            kind = "other"
+            text = "NO"
+
+        with self.lock:
+            self.calls[kind] += 1
+        return text
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if self.path.endswith("/count_tokens"):
+                    self._send_json({"input_tokens": len(json.dumps(body)) // 4})
+                    return
+                time.sleep(max(0.0, fake.latency + random.uniform(-fake.jitter, fake.jitter)))
+                text = fake.respond(body)
+                content, stop_reason = [{"type": "text", "text": text}], "end_turn"
+                tool_choice = body.get("tool_choice") or {}
+                if tool_choice.get("type") == "tool":
+                    # Forced tool use: answer with the canned JSON as the tool input
+                    content = [{"type": "tool_use", "id": f"toolu_replay_{next(_ids)}",
+                                "name": tool_choice["name"], "input": json.loads(text)}]
+                    stop_reason = "tool_use"
+                self._send_json({
+                    "id": f"msg_replay_{next(_ids)}",
+                    "type": "message",
+                    "role": "assistant",
+                    "model": body.get("model"),
+                    "content": content,
+                    "stop_reason": stop_reason,
+                    "stop_sequence": None,
+                    "usage": {"input_tokens": len(json.dumps(body)) // 4, "output_tokens": len(text) // 4},
+                })
+
+            def _send_json(self, data):
+                payload = json.dumps(data).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+# ---------------------------------------------------------------------------
+# Fake backend
+# ---------------------------------------------------------------------------
+
+class FakeBackend:
+    """Just enough of the Flask API for the bot: list and create socials."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.socials = []
+        self.lock = threading.Lock()
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, status, data):
+                payload = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                time.sleep(fake.latency)
+                self._send(200, fake.socials)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                time.sleep(fake.latency)
+                with fake.lock:
+                    social = dict(body, id=len(fake.socials) + 1)
+                    fake.socials.append(social)
+                self._send(201, social)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def serve(handler) -> str:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# ---------------------------------------------------------------------------
+# Discord stubs
+# ---------------------------------------------------------------------------
+
+class StubUser:
+    def __init__(self, name: str):
+        self.id = abs(hash(("user", name))) % 10**17
+        self.name = name
+        self.bot = False
+
+    def __str__(self):
+        return self.name
+
+
+class StubGuild:
+    def __init__(self, name: str):
+        self.id = abs(hash(("guild", name))) % 10**17
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+
+class StubChannel:
+    """Records everything the bot sends instead of talking to Discord."""
+
+    def __init__(self, name: str, guild: StubGuild, parent=None):
+        self.id = next(_ids)
+        self.name = name
+        self.guild = guild
+        self.parent = parent
+        self.mention = f"<#{self.id}>"
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append((content, kwargs))
+
+    def __str__(self):
+        return self.name
+
+
+class StubAttachment:
+    def __init__(self, path: Path):
+        self.id = next(_ids)
+        self.filename = path.name
+        self.content_type = "image/jpeg"
+        self._data = path.read_bytes()
+        self.size = len(self._data)
+
+    async def read(self):
+        return self._data
+
+
+class StubMessage:
+    def __init__(self, content: str, author: StubUser, channel: StubChannel, attachments=()):
+        self.id = next(_ids)
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.attachments = list(attachments)
+        self.reference = None
+
+    async def create_thread(self, name: str, auto_archive_duration: int = 60):
+        return StubChannel(name, self.guild, parent=self.channel)
+
+
+def load_messages(path: Path) -> list[tuple[str, str, str, str]]:
+    """Parse (guild, channel, author, content) tuples from a text_log.txt-style file."""
+    messages = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            match = LOG_LINE.match(line.rstrip("\n"))
+            if match:
+                messages.append((match["guild"], match["channel"], match["author"], match["content"]))
+    return messages
+
+
+# ---------------------------------------------------------------------------
+# Stage timing
+# ---------------------------------------------------------------------------
+
+class StageTimer:
+    def __init__(self):
+        self.samples = defaultdict(list)  # {stage: [seconds, ...]}
+
+    def wrap_sync(self, stage: str, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.samples[stage].append(time.perf_counter() - start)
+        return timed
+
+    def wrap_async(self, stage: str, func):
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.samples[stage].append(time.perf_counter() - start)
+        return timed
+
+    def report(self) -> None:
+        print(f"{'stage':<12} {'calls':>7} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'total s':>9}")
+        for stage, samples in self.samples.items():
+            ordered = sorted(samples)
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            print(f"{stage:<12} {len(samples):>7} {statistics.mean(samples) * 1000:>9.1f} "
+                  f"{statistics.median(samples) * 1000:>9.1f} {p95 * 1000:>9.1f} {sum(samples):>9.2f}")
+
+
+# ---------------------------------------------------------------------------
+# Replay
+# ---------------------------------------------------------------------------
+
+async def replay(args, records, fake_llm: FakeAnthropic) -> None:
+    import requests
+    import discord_bot as bot_module
+
+    bot_module.setup_services()
+    timer = StageTimer()
+
+    # Stage wrappers. The bot looks these up as module globals at call time.
+    async def no_commands(message):
+        pass
+
+    bot_module.bot.process_commands = no_commands
+    bot_module.event_parser.classify_batch = timer.wrap_sync("llm", bot_module.event_parser.classify_batch)
+    bot_module.check_duplicate_event = timer.wrap_async("dedup", bot_module.check_duplicate_event)
+    bot_module.count_faces_cached = timer.wrap_async("image", bot_module.count_faces_cached)
+    requests.post = timer.wrap_sync("backend", requests.post)
+
+    # "prefilter" is on_message's own work up to handing the message to the batcher. A full
+    # batch is then classified inline, but that belongs to the "llm" stage, not this one.
+    entered = {}  # {message id: perf_counter at on_message entry}
+    submit = bot_module.message_batcher.submit
+
+    async def timed_submit(message):
+        start = entered.pop(message.id, None)
+        if start is not None:
+            timer.samples["prefilter"].append(time.perf_counter() - start)
+        await submit(message)
+
+    async def on_message(message):
+        entered[message.id] = time.perf_counter()
+        await bot_module.on_message(message)
+        start = entered.pop(message.id, None)
+        if start is not None:  # handled without reaching the batcher (e.g. no text)
+            timer.samples["prefilter"].append(time.perf_counter() - start)
+
+    bot_module.message_batcher.submit = timed_submit
+    bot_module.message_log.start()
+
+    images = sorted(p for p in Path(args.images).iterdir() if p.is_file()) if args.images else []
+
+    # Load the Anthropic SDK (and face models) first, as the bot does once connected,
+    # so the first "llm" and "image" samples don't include the imports
+    await asyncio.to_thread(bot_module.event_parser.warm_up)
+    if images:
+        await bot_module.face_pool.warm_up()
+    guilds, channels, users = {}, {}, {}
+
+    start = time.perf_counter()
+    for i, (guild_name, channel_name, author_name, content) in enumerate(records):
+        guild = guilds.setdefault(guild_name, StubGuild(guild_name))
+        channel = channels.setdefault((guild_name, channel_name), StubChannel(channel_name, guild))
+        author = users.setdefault(author_name, StubUser(author_name))
+        attachments = [StubAttachment(images[i % len(images)])] if images and i % args.image_every == 0 else []
+
+        await on_message(StubMessage(content, author, channel, attachments))
+        if args.rate:
+            await asyncio.sleep(1 / args.rate)
+
+    # Drain everything still in flight, including batches their timers already flushed
+    await bot_module.message_batcher.flush_all()
+    while bot_module.background_tasks:
+        await asyncio.gather(*list(bot_module.background_tasks), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+
+    await bot_module.message_log.close()
+    bot_module.face_pool.shutdown()
+
+    llm_calls = sum(fake_llm.calls.values())
+    replies = sum(len(c.sent) for c in channels.values())
+    print(f"\nReplayed {len(records)} messages in {elapsed:.2f}s ({len(records) / elapsed:.1f} msg/s)")
+    print(f"LLM calls: {llm_calls} ({llm_calls / len(records):.2f} per message) {dict(fake_llm.calls)}")
+    print(f"Bot replies sent: {replies}\n")
+    timer.report()
+    print()
+    bot_module.event_parser.log_stats(force=True)
+    if args.metrics:
+        print()
+        print(bot_module.metrics.render(), end="")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", type=Path, help="recorded messages in text_log.txt format")
+    parser.add_argument("--rate", type=float, default=0, help="messages per second to feed (0 = as fast as possible)")
+    parser.add_argument("--limit", type=int, default=0, help="only replay the first N messages")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="fake Anthropic response time in seconds")
+    parser.add_argument("--llm-jitter", type=float, default=0.1, help="+/- random variation of the LLM latency")
+    parser.add_argument("--canned", type=Path, help="JSON file mapping message text to classification result")
+    parser.add_argument("--backend-url", help="use this backend instead of the local fake")
+    parser.add_argument("--backend-latency", type=float, default=0.01, help="fake backend response time in seconds")
+    parser.add_argument("--images", help="directory of images to attach to replayed messages")
+    parser.add_argument("--image-every", type=int, default=10, help="attach an image to every Nth message")
+    parser.add_argument("--metrics", action="store_true", help="print the bot's Prometheus metrics at the end")
+    args = parser.parse_args()
+
+    records = load_messages(args.log)[:args.limit or None]
+    if not records:
+        print(f"No messages found in {args.log}", file=sys.stderr)
+        return 1
+
+    canned = json.loads(args.canned.read_text()) if args.canned else {}
+    fake_llm = FakeAnthropic(args.llm_latency, args.llm_jitter, canned)
+    workdir = tempfile.mkdtemp(prefix="bot_replay_")
+
+    # Point the bot at the fakes before it is imported - it reads its config at import and setup time
+    os.environ["ANTHROPIC_BASE_URL"] = serve(fake_llm.handler())
+    os.environ["ANTHROPIC_API_KEY"] = "replay"
+    os.environ["BACKEND_URL"] = args.backend_url or serve(FakeBackend(args.backend_latency).handler())
+    os.environ["LLM_CACHE_PATH"] = ""
+    os.environ["MESSAGE_LOG_PATH"] = os.path.join(workdir, "text_log.txt")
+    os.environ.pop("INCOMPLETE_EVENTS_PATH", None)
+    os.environ.pop("IMAGE_CACHE_PATH", None)
+    os.environ["METRICS_PORT"] = "0"
+
+    asyncio.run(replay(args, records, fake_llm))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def normalize_content(text: str) -> str:
+    """
+    Normalize a message so trivially different copies share a cache entry:
+    case, repeated whitespace and leading/trailing/repeated punctuation are ignored.
+    """
+    text = " ".join(text.lower().split())
+    text = re.sub(r"([^\w\s])\1+", r"\1", text)
+    return text.strip(" .,!?~-")
+
+
+class CacheStats:
+    """Hit/miss counters for one kind of cached call."""
+
+    __slots__ = ("hits", "misses")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ResponseCache:
+    """
+    Bounded LRU + TTL cache for LLM results, keyed on normalized content and prompt version.
+
+    Entries live in memory and, when a path is given, are written through to SQLite so
+    they survive restarts. The in-memory LRU is exact; on disk the oldest-written rows
+    are trimmed first, so hits never cost a write. Values must be JSON-serializable.
+    """
+
+    def __init__(self, path: str | None = None, max_entries: int = 10000, ttl: float = 7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.memory = OrderedDict()  # {key: (expires_at, value)}, least recently used first
+        self.stats = {}  # {kind: CacheStats}
+        self._lock = threading.Lock()
+        self._db = None
+        self._writes = 0
+
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    written_at REAL NOT NULL
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_written_at ON llm_cache(written_at)")
+            self._db.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+
+    @staticmethod
+    def make_key(kind: str, content: str, version: str) -> str:
+        raw = f"{kind}\0{version}\0{normalize_content(content)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, kind: str, content: str, version: str = ""):
+        """Return the cached value, or None on a miss or expired entry."""
+        key = self.make_key(kind, content, version)
+        stats = self.stats.setdefault(kind, CacheStats())
+        now = time.time()
+
+        with self._lock:
+            entry = self.memory.get(key)
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row:
+                    entry = (row[1], json.loads(row[0]))
+                    self.memory[key] = entry
+                    self._trim_memory()
+
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    self._delete(key)
+                stats.misses += 1
+                return None
+
+            self.memory.move_to_end(key)
+            stats.hits += 1
+            return entry[1]
+
+    def set(self, kind: str, content: str, value, version: str = "") -> None:
+        key = self.make_key(kind, content, version)
+        now = time.time()
+        expires_at = now + self.ttl
+
+        with self._lock:
+            self.memory[key] = (expires_at, value)
+            self.memory.move_to_end(key)
+            self._trim_memory()
+
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, kind, value, expires_at, written_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, kind, json.dumps(value), expires_at, now)
+                )
+                self._writes += 1
+                # Trimming the table needs a COUNT, so only do it every so often
+                if self._writes % 100 == 0:
+                    self._trim_db(now)
+                self._db.commit()
+
+    def summary(self) -> str:
+        parts = [f"{kind} {s.hits}/{s.hits + s.misses} ({s.hit_rate:.0%})" for kind, s in self.stats.items()]
+        return "response cache hits: " + (", ".join(parts) if parts else "none yet")
+
+    def _delete(self, key: str) -> None:
+        self.memory.pop(key, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._db.commit()
+
+    def _trim_memory(self) -> None:
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def _trim_db(self, now: float) -> None:
+        self._db.execute("DELETE FROM llm_cache WHERE expires_at < ?", (now,))
+        count = self._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        if count > self.max_entries:
+            self._db.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY written_at LIMIT ?)",
+                (count - self.max_entries,)
+            )
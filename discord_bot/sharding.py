@@ -0,0 +1,92 @@
+import os
+
+
+def parse_shard_ids(value: str) -> list[int]:
+    """Parse SHARD_IDS: a comma-separated list of ids and ranges, e.g. "0,1" or "4-7"."""
+    ids = []
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            ids.extend(range(int(first), int(last) + 1))
+        else:
+            ids.append(int(part))
+    return sorted(set(ids))
+
+
+def shard_for_guild(guild_id: int, shard_count: int) -> int:
+    """The shard Discord delivers a guild's events to."""
+    return (int(guild_id) >> 22) % shard_count
+
+
+class ShardConfig:
+    """
+    Which shards this process runs.
+
+    Unsharded (SHARD_COUNT unset) the bot is a plain single-process commands.Bot.
+    With SHARD_COUNT set it runs as an AutoShardedBot over SHARD_IDS (default: all
+    of them). Several processes can split the shards between them, each given a
+    disjoint SHARD_IDS - see launcher.py. Discord only sends a process the events
+    of its own guilds, so every piece of per-guild state (parser context, dedup
+    index, incomplete events) stays local to one process without any locking.
+    """
+
+    def __init__(self, shard_count: int | None = None, shard_ids: list[int] | None = None):
+        self.shard_count = shard_count
+        self.shard_ids = shard_ids if shard_ids is not None else (
+            list(range(shard_count)) if shard_count else None
+        )
+        if self.shard_count and any(not 0 <= i < self.shard_count for i in self.shard_ids):
+            raise ValueError(f"SHARD_IDS {self.shard_ids} out of range for SHARD_COUNT={self.shard_count}")
+
+    @classmethod
+    def from_env(cls) -> 'ShardConfig':
+        count = os.getenv('SHARD_COUNT')
+        ids = os.getenv('SHARD_IDS')
+        return cls(
+            shard_count=int(count) if count else None,
+            shard_ids=parse_shard_ids(ids) if count and ids else None
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.shard_count)
+
+    @property
+    def share(self) -> float:
+        """This process's fraction of the shards, for splitting global limits like the LLM rate limit."""
+        return len(self.shard_ids) / self.shard_count if self.enabled else 1.0
+
+    @property
+    def label(self) -> str:
+        if not self.enabled:
+            return "unsharded"
+        return f"shards {','.join(map(str, self.shard_ids))} of {self.shard_count}"
+
+    def bot_kwargs(self) -> dict:
+        """Keyword arguments for commands.AutoShardedBot."""
+        return {'shard_count': self.shard_count, 'shard_ids': self.shard_ids} if self.enabled else {}
+
+    def owns(self, guild_id) -> bool:
+        """True if this process handles the guild. DMs (no guild) arrive on shard 0."""
+        if not self.enabled:
+            return True
+        shard = 0 if guild_id is None else shard_for_guild(guild_id, self.shard_count)
+        return shard in self.shard_ids
+
+    def path(self, path: str | None) -> str | None:
+        """
+        Per-process variant of a state file path, so processes never share a SQLite
+        database or log file: "llm_cache.sqlite3" -> "llm_cache.shard4-7.sqlite3".
+        """
+        if not path or not self.enabled or len(self.shard_ids) == self.shard_count:
+            return path
+        root, ext = os.path.splitext(path)
+        first, last = self.shard_ids[0], self.shard_ids[-1]
+        if self.shard_ids == list(range(first, last + 1)):
+            suffix = str(first) if first == last else f"{first}-{last}"
+        else:
+            suffix = "_".join(map(str, self.shard_ids))
+        return f"{root}.shard{suffix}{ext}"
@@ -0,0 +1,93 @@
+import os
+import sys
+import json
+import time
+import importlib
+import threading
+
+
+def process_start() -> float:
+    """
+    When this process started, on the time.monotonic() clock. Read from /proc on
+    Linux; elsewhere falls back to now (i.e. when this module was imported).
+    """
+    try:
+        with open('/proc/self/stat', encoding='ascii') as f:
+            # Field 22 is the start time in clock ticks since boot; skip past "(comm)",
+            # which may itself contain spaces, so the state (field 3) is index 0
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime', encoding='ascii') as f:
+            uptime = float(f.read().split()[0])
+        age = uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+        return time.monotonic() - max(0.0, age)
+    except (OSError, ValueError, IndexError):
+        return time.monotonic()
+
+
+class StartupProfile:
+    """
+    Milestones from process start to the first handled message, plus the time spent
+    in imports deferred until first use.
+
+    mark() records how long after process start a milestone was reached (only the
+    first time). The "interpreter" milestone is when this module was imported, i.e.
+    Python's own startup plus anything imported before it. report() prints them; with STARTUP_PROFILE_PATH set, each run also
+    appends one JSON line there so cold-start time can be tracked across restarts.
+    """
+
+    def __init__(self):
+        self.started = process_start()
+        self.milestones = {'interpreter': time.monotonic() - self.started}  # {name: seconds since start}
+        self.imports = {}  # {module: (seconds, milestone it happened before)}
+        self._lock = threading.Lock()
+
+    def mark(self, name: str) -> bool:
+        """Record a milestone. Returns False if it was already recorded."""
+        with self._lock:
+            if name in self.milestones:
+                return False
+            self.milestones[name] = time.monotonic() - self.started
+            return True
+
+    def lazy_import(self, name: str):
+        """Import a module on first use, timing the import if it wasn't loaded yet."""
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+
+        start = time.monotonic()
+        module = importlib.import_module(name)
+        with self._lock:
+            self.imports.setdefault(name, (time.monotonic() - start, len(self.milestones)))
+        return module
+
+    def report(self) -> None:
+        with self._lock:
+            milestones = dict(self.milestones)
+            imports = dict(self.imports)
+
+        steps = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in milestones.items())
+        names = list(milestones)
+        lazy = ", ".join(
+            f"{module} {seconds:.2f}s (before {names[after] if after < len(names) else 'report'})"
+            for module, (seconds, after) in imports.items()
+        )
+        print(f"startup: {steps}" + (f"; lazy imports: {lazy}" if lazy else ""), flush=True)
+
+        path = os.getenv('STARTUP_PROFILE_PATH')
+        if path:
+            record = {
+                'time': time.time(),
+                'pid': os.getpid(),
+                'milestones': milestones,
+                'imports': {module: seconds for module, (seconds, _) in imports.items()},
+            }
+            try:
+                with open(path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record) + "\n")
+            except OSError as e:
+                print(f"Error writing startup profile: {e}", flush=True)
+
+
+# One per process, created when the bot module starts importing
+startup = StartupProfile()
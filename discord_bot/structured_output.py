@@ -0,0 +1,331 @@
+import json
+
+# Tool definitions used to get structured output from Claude. The model is forced to
+# call the tool (tool_choice), so its answer arrives as an already-parsed `input` dict
+# instead of free text. Keep these byte-identical between calls - tools sit at the
+# very start of the cached prompt prefix.
+CLASSIFY_TOOL = {
+    "name": "record_classification",
+    "description": "Record whether the Discord message is planning a social activity, and its details.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "is_event": {"type": "boolean", "description": "True if the message plans or suggests a social activity"},
+            "name": {"type": ["string", "null"], "description": "Name/title of the activity, required if is_event"},
+            "location": {"type": ["string", "null"], "description": "Location mentioned, or null"},
+            "description": {"type": ["string", "null"], "description": "Brief description of the activity, or null"},
+            "datetime_hint": {"type": ["string", "null"], "description": "Any date/time mentioned, or null"},
+            "confidence": {"type": "number", "minimum": 0, "maximum": 1,
+                           "description": "0-1 confidence this is social activity planning"},
+        },
+        "required": ["is_event", "confidence"],
+    },
+}
+
+# A burst of messages from one channel, classified in one call: one entry per distinct event
+CLASSIFY_BATCH_TOOL = {
+    "name": "record_classifications",
+    "description": "Record the social activities planned in a numbered batch of Discord messages, one entry per distinct event.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "events": {
+                "type": "array",
+                "description": "One entry per distinct event being planned; empty if there are none",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        **CLASSIFY_TOOL["input_schema"]["properties"],
+                        "message_index": {"type": "integer", "minimum": 0,
+                                          "description": "Number of the message that proposes the event"},
+                    },
+                    "required": CLASSIFY_TOOL["input_schema"]["required"] + ["message_index"],
+                },
+            },
+        },
+        "required": ["events"],
+    },
+}
+
+# Offered together on every classification call (each call forces its own), so single
+# and batch classifications share one cached prefix
+CLASSIFY_TOOLS = [CLASSIFY_TOOL, CLASSIFY_BATCH_TOOL]
+
+EXTRACT_TOOL = {
+    "name": "record_event_details",
+    "description": "Record the event details mentioned in the message. Use null for anything not mentioned.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "name": {"type": ["string", "null"], "description": "Event name/title if mentioned"},
+            "datetime_hint": {"type": ["string", "null"], "description": "Date/time if mentioned"},
+            "location": {"type": ["string", "null"], "description": "Location if mentioned"},
+            "description": {"type": ["string", "null"], "description": "Additional details if mentioned"},
+        },
+        "required": [],
+    },
+}
+
+_TYPES = {
+    "string": str,
+    "number": (int, float),
+    "integer": int,
+    "boolean": bool,
+    "object": dict,
+    "array": list,
+    "null": type(None),
+}
+
+
+def validate(data, schema: dict) -> tuple[dict, dict]:
+    """
+    Check a tool input against the subset of JSON Schema used above (object
+    properties, type, required, minimum/maximum, and arrays of objects via items).
+
+    Obvious slips are coerced rather than rejected ("0.8" -> 0.8, "true" -> True),
+    and unknown keys are dropped. Returns (cleaned data, {field: error}); an empty
+    error dict means the data is valid. An array with some invalid items is reported
+    as an error but keeps its valid items in the cleaned data.
+    """
+    if not isinstance(data, dict):
+        return {}, {"*": "expected a JSON object"}
+
+    cleaned, errors = {}, {}
+    properties = schema.get("properties", {})
+    for field, spec in properties.items():
+        if field not in data:
+            if field in schema.get("required", []):
+                errors[field] = "missing"
+            continue
+
+        value = _coerce(data[field], spec)
+        error = _check(value, spec)
+        if not error and isinstance(value, list) and "items" in spec:
+            value, error = _validate_items(value, spec["items"])
+            cleaned[field] = value
+        elif not error:
+            cleaned[field] = value
+        if error:
+            errors[field] = error
+    return cleaned, errors
+
+
+def _validate_items(items: list, schema: dict) -> tuple[list, str | None]:
+    """Validate each object in an array. Returns (the valid items, cleaned; a summary of the invalid ones or None)."""
+    valid, problems = [], []
+    for i, item in enumerate(items):
+        cleaned, errors = validate(item, schema)
+        if errors:
+            problems.append(f"item {i} (" + ", ".join(f"{f} {e}" for f, e in errors.items()) + ")")
+        else:
+            valid.append(cleaned)
+    return valid, "; ".join(problems) or None
+
+
+def _types(spec: dict) -> list[str]:
+    types = spec.get("type", [])
+    return [types] if isinstance(types, str) else list(types)
+
+
+def _coerce(value, spec: dict):
+    types = _types(spec)
+    if isinstance(value, str):
+        text = value.strip()
+        if "null" in types and text.lower() in ("", "null", "none"):
+            return None
+        if "boolean" in types and text.lower() in ("true", "false"):
+            return text.lower() == "true"
+        if "integer" in types and text.isascii() and text.isdigit():
+            return int(text)
+        if "number" in types:
+            try:
+                return float(text)
+            except ValueError:
+                pass
+    if "integer" in types and isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _check(value, spec: dict) -> str | None:
+    types = _types(spec)
+    # bool is an int subclass - don't let True pass as a number
+    if isinstance(value, bool):
+        ok = "boolean" in types
+    else:
+        ok = any(isinstance(value, _TYPES[t]) for t in types if t in _TYPES)
+    if not ok:
+        return f"expected {' or '.join(types)}, got {json.dumps(value)}"
+
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if "minimum" in spec and value < spec["minimum"]:
+            return f"must be >= {spec['minimum']}"
+        if "maximum" in spec and value > spec["maximum"]:
+            return f"must be <= {spec['maximum']}"
+    return None
+
+
+def extract_json(text: str):
+    """
+    Pull the first JSON object or array out of model text.
+
+    Tolerates markdown fences and prose around the JSON, and completes output that
+    was cut off mid-value (e.g. by max_tokens) by closing open strings and brackets.
+    Returns the parsed value, or None if nothing usable is found.
+    """
+    decoder = json.JSONDecoder()
+    start = _find_start(text, 0)
+    while start != -1:
+        try:
+            value, _ = decoder.raw_decode(text, start)
+            return value
+        except json.JSONDecodeError:
+            pass
+
+        for completed in _complete(text[start:]):
+            try:
+                return json.loads(completed)
+            except json.JSONDecodeError:
+                pass
+        start = _find_start(text, start + 1)
+    return None
+
+
+def _find_start(text: str, position: int) -> int:
+    starts = [i for i in (text.find("{", position), text.find("[", position)) if i != -1]
+    return min(starts) if starts else -1
+
+
+def _complete(fragment: str) -> list[str]:
+    """
+    Scan a truncated JSON fragment once, tracking open strings and brackets, and return
+    candidate completions: the fragment with its missing closers appended, then the
+    fragment cut back to its last complete member (for a dangling key or a value that
+    can't be closed). Empty if the brackets don't match up.
+    """
+    stack = []
+    in_string = escaped = False
+    last_safe, safe_stack = 0, []  # end of the last complete member and the brackets open there
+    for i, char in enumerate(fragment):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            if not stack or stack.pop() != char:
+                return []
+            if not stack:
+                # Complete value that still failed to parse - nothing to finish off
+                return []
+            last_safe, safe_stack = i + 1, list(stack)
+        elif char == ",":
+            last_safe, safe_stack = i, list(stack)
+
+    if not stack:
+        return []
+
+    body = (fragment + '"' if in_string else fragment).rstrip().rstrip(",")
+    candidates = [body + "".join(reversed(stack))]
+    if last_safe:
+        candidates.append(fragment[:last_safe].rstrip().rstrip(",") + "".join(reversed(safe_stack)))
+    return candidates
+
+
+def response_input(response, tool_name: str):
+    """
+    The structured answer in a response: the named tool_use block's input if the model
+    called the tool, otherwise whatever JSON can be extracted from its text.
+    """
+    text = []
+    for block in response.content:
+        block_type = getattr(block, "type", None)
+        if block_type == "tool_use" and getattr(block, "name", None) == tool_name:
+            return block.input
+        if block_type == "text":
+            text.append(block.text)
+    return extract_json("".join(text))
+
+
+def tool_call(router, task: str, tool: dict, messages: list[dict], escalate: bool = False,
+              tools: list[dict] | None = None, **kwargs):
+    """
+    Ask for structured output through `tool` and validate it against the tool's schema.
+
+    If some fields are invalid or missing, one repair request goes back to the model
+    with the errors, asking only for those fields, and the answers are merged. That is
+    the whole retry budget. Returns (data, errors, response); errors is empty on success.
+    `tools` is the full list to offer when `tool` shares a cached prefix with calls
+    forcing another tool (see CLASSIFY_TOOLS); it defaults to [tool].
+    """
+    response = router.create(
+        task,
+        escalate=escalate,
+        tools=tools or [tool],
+        tool_choice={"type": "tool", "name": tool["name"]},
+        messages=messages,
+        **kwargs
+    )
+    data, errors = validate(response_input(response, tool["name"]), tool["input_schema"])
+    if not errors:
+        return data, errors, response
+
+    print(f"Invalid {task} output {errors}, asking again for those fields only", flush=True)
+    repair_tool = _repair_tool(tool, errors)
+    repair = router.create(
+        task,
+        escalate=escalate,
+        tools=[repair_tool],
+        tool_choice={"type": "tool", "name": repair_tool["name"]},
+        messages=messages + _repair_turns(response, tool["name"], errors),
+        **kwargs
+    )
+    fixed, still_invalid = validate(response_input(repair, repair_tool["name"]), repair_tool["input_schema"])
+    data.update(fixed)
+    return data, still_invalid, repair
+
+
+def _repair_tool(tool: dict, errors: dict) -> dict:
+    """The same tool, cut down to the fields that need fixing."""
+    schema = tool["input_schema"]
+    fields = list(schema["properties"]) if "*" in errors else [f for f in errors if f in schema["properties"]]
+    return {
+        "name": tool["name"],
+        "description": tool["description"],
+        "input_schema": {
+            "type": "object",
+            "properties": {f: schema["properties"][f] for f in fields},
+            "required": fields,
+        },
+    }
+
+
+def _repair_turns(response, tool_name: str, errors: dict) -> list[dict]:
+    """Echo the bad answer back and explain what was wrong with it."""
+    problems = "; ".join(f"{field}: {error}" for field, error in errors.items())
+    request = f"Your answer had invalid fields ({problems}). Call {tool_name} again with only those fields, corrected."
+
+    tool_use = next((b for b in response.content if getattr(b, "type", None) == "tool_use"), None)
+    if tool_use is not None:
+        return [
+            {"role": "assistant", "content": [
+                {"type": "tool_use", "id": tool_use.id, "name": tool_use.name, "input": tool_use.input}
+            ]},
+            {"role": "user", "content": [
+                {"type": "tool_result", "tool_use_id": tool_use.id, "is_error": True, "content": request}
+            ]},
+        ]
+
+    text = "".join(getattr(b, "text", "") for b in response.content) or "(empty)"
+    return [
+        {"role": "assistant", "content": text},
+        {"role": "user", "content": request},
+    ]
@@ -9,6 +9,7 @@ function Scheduling() {
   const [loading, setLoading] = useState(false)
   const [submitted, setSubmitted] = useState(false)
   const [social, setSocial] = useState(null)
+  const [slotCounts, setSlotCounts] = useState({})
   const [error, setError] = useState(null)
 
   // Get social ID, username, and discord_id from URL query params
@@ -26,18 +27,34 @@ function Scheduling() {
     setSocialId(parseInt(id))
     setUsername(user)
     setDiscordId(parseInt(did))
-    fetchSocial(parseInt(id))
+    fetchPage(parseInt(id), user, parseInt(did))
   }, [])
 
-  const fetchSocial = async (id) => {
+  // One request for the event, everyone's availability and our own earlier submission
+  const fetchPage = async (id, user, did) => {
     try {
-      const response = await fetch(`http://localhost:5000/api/socials/${id}`)
+      const params = new URLSearchParams({ username: user, discord_id: did })
+      const response = await fetch(`http://localhost:5000/api/socials/${id}/page?${params}`)
       if (!response.ok) {
         setError('Event not found')
         return
       }
       const data = await response.json()
-      setSocial(data)
+      setSocial(data.social)
+
+      const counts = {}
+      data.availability.slots.forEach(({ date, time, available }) => {
+        counts[`${date}_${time}`] = available
+      })
+      setSlotCounts(counts)
+
+      // Pre-select the times this user already submitted
+      const previous = {}
+      const previousSlots = data.my_submission?.availability_slots || []
+      previousSlots.forEach(({ date, times }) => {
+        (times || []).forEach(time => { previous[`${date}_${time}`] = true })
+      })
+      setSelectedDates(previous)
     } catch (err) {
       setError('Failed to load event details')
     }
@@ -151,6 +168,7 @@ function Scheduling() {
                       {timeSlots.map(time => {
                         const key = `${date}_${time}`
                         const isSelected = selectedDates[key]
+                        const available = slotCounts[key]
                         return (
                           <button
                             key={key}
@@ -159,6 +177,7 @@ function Scheduling() {
                             onClick={() => handleDateToggle(date, time)}
                           >
                             {time}
+                            {available > 0 && <span className="slot-count">{available}</span>}
                           </button>
                         )
                       })}